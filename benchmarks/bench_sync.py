@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""End-to-end ESL sync benchmark against the local mock SUNLUX server.
+
+Seeds synthetic catalogs of ESL-enabled product templates and measures, for
+each catalog size:
+
+- ``do_esl_sync``: ``_do_esl_sync`` on the fresh catalog (full sync path)
+- ``bulk_sync``:   every price changed, ``action_sunlux_bulk_sync`` + queue drain
+- ``cron``:        10% of prices changed, incremental cron + queue drain
+
+and reports wall time, products/second, SQL query count, peak Python memory
+and the number of HTTP requests the mock server received.
+
+The benchmark commits (the queue and the cron do), so run it against a
+throw-away database with the module installed::
+
+    ESL_BENCH_SIZES=1000,10000 odoo-bin shell -c odoo.conf -d esl_bench --no-http \\
+        < benchmarks/bench_sync.py | tee bench_output.txt
+
+Tunables (environment variables): ``ESL_BENCH_SIZES`` (default
+``1000,10000,100000``), ``ESL_BENCH_LATENCY`` (ms per mock request, default
+20), ``ESL_BENCH_ERROR_RATE`` and ``ESL_BENCH_PARTIAL_RATE`` (default 0).
+"""
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+BENCH_DIR = (
+    os.path.dirname(os.path.abspath(__file__)) if '__file__' in globals() else 'benchmarks'
+)
+if BENCH_DIR not in sys.path:
+    sys.path.insert(0, BENCH_DIR)
+
+from mock_sunlux_server import start_server  # noqa: E402
+
+SEED_BATCH = 1000
+
+# Parameters pointed at the mock server for the duration of the run
+BENCH_PARAMS = {
+    'sunlux_esl.uid': 'bench-uid',
+    'sunlux_esl.sid': 'bench-sid',
+    'sunlux_esl.key': 'bench-key',
+    'sunlux_esl.token': '',
+    'sunlux_esl.token_expire': '',
+    'sunlux_esl.rate_limit': '0',
+    # Flush the queue right away instead of waiting for saves to settle
+    'sunlux_esl.queue_quiet_period': '0',
+    # The benchmark drains the queue through the cron entry point
+    'sunlux_esl.dedicated_worker': 'False',
+}
+
+
+def _seed_catalog(env, size):
+    """Create ``size`` ESL-enabled templates and return them."""
+    Product = env['product.template']
+    prefix = f'ESLBENCH{size}-'
+    existing = Product.search([('default_code', '=like', prefix + '%')])
+    if len(existing) == size:
+        existing.write({'sunlux_goods_id': False, 'sunlux_last_sync': False,
+                        'sunlux_payload_hash': False, 'sunlux_price_hash': False})
+        env.cr.commit()
+        return existing
+    existing.unlink()
+
+    products = Product.browse()
+    for start in range(0, size, SEED_BATCH):
+        vals_list = [{
+            'name': f'Bench product {size}/{i}',
+            'default_code': f'{prefix}{i:08d}',
+            'barcode': f'9{size:07d}{i:08d}',
+            'list_price': round(random.uniform(1, 100), 2),
+            'sunlux_esl_sync_enabled': True,
+        } for i in range(start, min(start + SEED_BATCH, size))]
+        products |= Product.create(vals_list)
+        env.cr.commit()
+        env.invalidate_all()
+    return products
+
+
+def _bump_prices(env, products, share=1.0):
+    """Change list prices in SQL (no write() hook) so fingerprints differ."""
+    ids = products.ids
+    if share < 1.0:
+        ids = random.sample(ids, max(1, int(len(ids) * share)))
+    env.cr.execute(
+        "UPDATE product_template SET list_price = list_price + 0.01, "
+        "write_date = now() at time zone 'UTC' WHERE id = ANY(%s)",
+        [ids],
+    )
+    env.cr.commit()
+    env.invalidate_all()
+    return len(ids)
+
+
+def _measure(env, server, name, count, func):
+    """Run ``func`` and return a result row."""
+    env.invalidate_all()
+    requests_before = sum(server.request_counts.values())
+    queries_before = env.cr.sql_log_count
+    tracemalloc.start()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        'scenario': name,
+        'products': count,
+        'seconds': elapsed,
+        'per_second': count / elapsed if elapsed else 0.0,
+        'queries': env.cr.sql_log_count - queries_before,
+        'peak_mb': peak / (1024 * 1024),
+        'http': sum(server.request_counts.values()) - requests_before,
+    }
+
+
+def _print_rows(rows):
+    header = f"{'size':>8} {'scenario':<12} {'products':>9} {'seconds':>9} " \
+             f"{'prod/s':>10} {'queries':>9} {'peak MB':>9} {'http':>6}"
+    print(header)
+    print('-' * len(header))
+    for size, row in rows:
+        print(f"{size:>8} {row['scenario']:<12} {row['products']:>9} {row['seconds']:>9.2f} "
+              f"{row['per_second']:>10.1f} {row['queries']:>9} {row['peak_mb']:>9.1f} "
+              f"{row['http']:>6}")
+
+
+def run(env, sizes=None, latency=None, error_rate=None, partial_rate=None):
+    """Run every scenario for every catalog size and print a report."""
+    sizes = sizes or [int(s) for s in os.environ.get('ESL_BENCH_SIZES', '1000,10000,100000').split(',')]
+    server = start_server(
+        latency=float(os.environ.get('ESL_BENCH_LATENCY', 20) if latency is None else latency),
+        error_rate=float(os.environ.get('ESL_BENCH_ERROR_RATE', 0) if error_rate is None else error_rate),
+        partial_rate=float(os.environ.get('ESL_BENCH_PARTIAL_RATE', 0) if partial_rate is None else partial_rate),
+    )
+    ICP = env['ir.config_parameter'].sudo()
+    params = dict(BENCH_PARAMS, **{'sunlux_esl.base_url': server.base_url})
+    saved = {key: ICP.get_param(key, '') for key in params}
+    for key, value in params.items():
+        ICP.set_param(key, value)
+    env['sunlux.esl.api']._invalidate_cache()
+    env.cr.commit()
+
+    Product = env['product.template']
+    Queue = env['sunlux.esl.sync.queue']
+    rows = []
+    try:
+        for size in sizes:
+            print(f"Seeding {size} products...", flush=True)
+            products = _seed_catalog(env, size)
+            ids = products.ids
+
+            def do_esl_sync():
+                batch = Product.browse(ids)
+                with env['sunlux.esl.log']._buffered():
+                    batch._do_esl_sync(env)
+                env.cr.commit()
+
+            rows.append((size, _measure(env, server, 'do_esl_sync', size, do_esl_sync)))
+
+            _bump_prices(env, products)
+
+            def bulk_sync():
+                Product.browse(ids).action_sunlux_bulk_sync()
+                Queue._cron_process_queue()
+
+            rows.append((size, _measure(env, server, 'bulk_sync', size, bulk_sync)))
+
+            changed = _bump_prices(env, products, share=0.1)
+
+            def cron():
+                Product._cron_sunlux_esl_sync()
+                Queue._cron_process_queue()
+
+            rows.append((size, _measure(env, server, 'cron', changed, cron)))
+    finally:
+        for key, value in saved.items():
+            ICP.set_param(key, value)
+        env['sunlux.esl.api']._invalidate_cache()
+        env.cr.commit()
+        server.shutdown()
+
+    _print_rows(rows)
+    return rows
+
+
+if 'env' in globals():
+    # Piped into `odoo-bin shell`
+    run(env)  # noqa: F821
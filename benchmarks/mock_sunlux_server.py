@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""Local stand-in for the SUNLUX ESL API, for benchmarks and offline testing.
+
+Implements the endpoints used by ``sunlux.esl.api``:
+
+- ``POST /epts-api/v2/sys/api/tToken``
+- ``POST /epts-api/goods/goods/batch/edit``
+- ``POST /epts-api/goods/goods/batchPrice``
+- ``POST /epts-api/goods/goods/list`` (goods created through ``batch/edit``,
+  plus any seeded with ``server.add_goods``)
+
+Behaviour is tunable: per-request latency (with jitter), a rate of failed
+requests (HTTP 500) and a rate of items reported as failed in an otherwise
+successful response (partial success).
+
+Standalone::
+
+    python benchmarks/mock_sunlux_server.py --port 8765 --latency 50 --error-rate 0.01
+
+then point Settings > SUNLUX API Base URL at ``http://127.0.0.1:8765``.
+Any UID / SID / Key is accepted.
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+TOKEN = 'mock-sunlux-token'
+
+
+def _goods_id(barcode):
+    """Stable fake goodsId for a barcode."""
+    return 'G' + hashlib.md5(barcode.encode('utf-8')).hexdigest()[:16]
+
+
+class MockSunluxHandler(BaseHTTPRequestHandler):
+    """Request handler; options live on the server (``self.server.options``)."""
+
+    protocol_version = 'HTTP/1.1'   # keep-alive, like the real endpoint
+
+    def log_message(self, fmt, *args):
+        if self.server.options.get('verbose'):
+            super().log_message(fmt, *args)
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        try:
+            return json.loads(raw or b'null')
+        except ValueError:
+            return None
+
+    def do_POST(self):
+        options = self.server.options
+        payload = self._read_json()
+        path = urlparse(self.path).path
+        self.server.count_request(path)
+
+        latency = options['latency'] + random.uniform(0, options['jitter'])
+        if latency:
+            time.sleep(latency / 1000.0)
+        if random.random() < options['error_rate']:
+            return self._reply(500, {'code': 500, 'msg': 'Injected server error'})
+
+        if path == '/epts-api/v2/sys/api/tToken':
+            return self._reply(200, {
+                'code': 200, 'msg': 'success',
+                'data': {'token': TOKEN, 'expire': 1440},
+            })
+        if self.headers.get('Authorization') != f'Bearer {TOKEN}':
+            return self._reply(401, {'code': 401, 'msg': 'Invalid token'})
+        if path == '/epts-api/goods/goods/list':
+            return self._reply(200, self._list_result(payload or {}))
+        if not isinstance(payload, list):
+            return self._reply(400, {'code': 400, 'msg': 'Expected a JSON list'})
+        if path == '/epts-api/goods/goods/batch/edit':
+            return self._reply(200, self._batch_result(payload, 'barCode'))
+        if path == '/epts-api/goods/goods/batchPrice':
+            return self._reply(200, self._batch_result(payload, 'goodsId'))
+        return self._reply(404, {'code': 404, 'msg': 'Unknown endpoint'})
+
+    def _batch_result(self, items, key):
+        """Split items into ``suc`` / ``msg`` according to the partial-failure rate."""
+        partial_rate = self.server.options['partial_rate']
+        suc, msg = [], []
+        for item in items:
+            value = (item or {}).get(key) or ''
+            if not value or random.random() < partial_rate:
+                msg.append({key: value, 'msg': 'Injected item failure'})
+                continue
+            goods_id = item.get('goodsId') or _goods_id(value)
+            suc.append({'barCode': item.get('barCode', ''), 'goodsId': goods_id})
+        if key == 'barCode':
+            self.server.add_goods(item['barCode'] for item in suc)
+        return {'code': 200, 'msg': 'success', 'data': {'suc': suc, 'msg': msg}}
+
+    def _list_result(self, query):
+        """One page of the known goods, ordered by barcode."""
+        page_num = max(int(query.get('pageNum') or 1), 1)
+        page_size = max(int(query.get('pageSize') or 10), 1)
+        barcodes = self.server.list_goods()
+        start = (page_num - 1) * page_size
+        rows = [
+            {'goodsId': _goods_id(barcode), 'barCode': barcode}
+            for barcode in barcodes[start:start + page_size]
+        ]
+        return {'code': 200, 'msg': 'success', 'data': {'rows': rows, 'total': len(barcodes)}}
+
+
+class MockSunluxServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, options):
+        super().__init__(address, MockSunluxHandler)
+        self.options = options
+        self.request_counts = {}
+        self.goods = set()
+        self._counts_lock = threading.Lock()
+        self._goods_lock = threading.Lock()
+
+    def count_request(self, path):
+        with self._counts_lock:
+            self.request_counts[path] = self.request_counts.get(path, 0) + 1
+
+    def add_goods(self, barcodes):
+        """Make ``barcodes`` known to the goods list endpoint."""
+        with self._goods_lock:
+            self.goods.update(barcodes)
+
+    def list_goods(self):
+        with self._goods_lock:
+            return sorted(self.goods)
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+
+def start_server(host='127.0.0.1', port=0, latency=0.0, jitter=0.0,
+                 error_rate=0.0, partial_rate=0.0, verbose=False):
+    """Start the mock server on a background thread and return it.
+
+    :param port: 0 picks a free port; read it back from ``server.base_url``
+    :param latency: fixed delay per request, in ms
+    :param jitter: extra random delay per request, up to this many ms
+    :param error_rate: probability (0-1) of answering HTTP 500
+    :param partial_rate: probability (0-1) of each item being reported failed
+    """
+    server = MockSunluxServer((host, port), {
+        'latency': latency,
+        'jitter': jitter,
+        'error_rate': error_rate,
+        'partial_rate': partial_rate,
+        'verbose': verbose,
+    })
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help='ms per request')
+    parser.add_argument('--jitter', type=float, default=0.0, help='extra random ms per request')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of HTTP 500 responses')
+    parser.add_argument('--partial-rate', type=float, default=0.0, help='share of failed items')
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    args = parser.parse_args()
+
+    server = start_server(
+        host=args.host, port=args.port, latency=args.latency, jitter=args.jitter,
+        error_rate=args.error_rate, partial_rate=args.partial_rate, verbose=args.verbose,
+    )
+    print(f'Mock SUNLUX API listening on {server.base_url} (Ctrl+C to stop)')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -4,10 +4,18 @@
     'version': '1.0.0',
     'category': 'Sales/Point of Sale',
     'summary': 'Sync Odoo products to SUNLUX Electronic Shelf Labels',
-    'depends': ['point_of_sale', 'product'],
+    'depends': ['point_of_sale', 'product', 'stock'],
     'data': [
         'security/ir.model.access.csv',
         'views/sunlux_esl_log_views.xml',
+        'views/sunlux_esl_sync_queue_views.xml',
+        'views/sunlux_esl_log_stats_views.xml',
+        'views/sunlux_esl_log_report_views.xml',
+        'views/sunlux_esl_sync_run_views.xml',
+        'views/sunlux_esl_promotion_views.xml',
+        'views/sunlux_esl_store_views.xml',
+        'views/sunlux_esl_onboarding_views.xml',
+        'views/sunlux_esl_circuit_views.xml',
         'views/res_config_settings_views.xml',
         'views/product_template_views.xml',
         'data/ir_cron.xml',
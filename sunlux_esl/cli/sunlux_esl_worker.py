@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+import argparse
+import logging
+import os
+import select
+import signal
+
+import psycopg2
+
+from odoo import SUPERUSER_ID, api, fields, sql_db
+from odoo.cli import Command
+from odoo.modules.registry import Registry
+from odoo.tools import SQL, config
+
+from ..models.sunlux_esl_sync_queue import NOTIFY_CHANNEL
+
+_logger = logging.getLogger(__name__)
+
+# Longest sleep without a notification, to pick up missed work (e.g. stale
+# claims of a worker that died)
+DEFAULT_POLL_INTERVAL = 60          # seconds
+# Wait before reconnecting after the database went away
+RECONNECT_DELAY = 5                 # seconds
+
+
+class SunluxEslWorker(Command):
+    """Drain the SUNLUX ESL sync queue in a dedicated process.
+
+    Holds a LISTEN connection on the database and wakes up when a save
+    queues products (NOTIFY on commit), when a debounced flush or a retry
+    is due, or after ``--poll-interval`` seconds. The HTTP sessions and
+    cached tokens of the API client live as long as the process, so
+    consecutive batches reuse their connections.
+
+    Enable "Dedicated Worker" in Settings so the queue crons stand down,
+    then run one worker per database (or several: batches are claimed
+    with SKIP LOCKED). A worker drains every store in turn; with
+    ``--store`` it only drains the given ones, so a slow or unreachable
+    store can be given a worker of its own::
+
+        odoo-bin sunlux_esl_worker -c odoo.conf -d mydb
+        odoo-bin sunlux_esl_worker -c odoo.conf -d mydb --store 0 --store 3
+    """
+
+    name = 'sunlux_esl_worker'
+
+    def run(self, cmdargs):
+        parser = argparse.ArgumentParser(
+            prog=f'odoo-bin {self.name}',
+            description=self.__doc__.strip().splitlines()[0],
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=DEFAULT_POLL_INTERVAL,
+            help="Longest sleep without a notification, in seconds (default: %(default)s)",
+        )
+        parser.add_argument(
+            '--store', type=int, action='append', dest='store_ids', metavar='ID',
+            help="Only drain the queue of this store, 0 for the credentials from "
+                 "Settings; repeat for several (default: every store)",
+        )
+        options, odoo_args = parser.parse_known_args(cmdargs)
+        config.parse_config(odoo_args, setup_logging=True)
+
+        dbnames = config['db_name']
+        if isinstance(dbnames, str):
+            dbnames = [name for name in dbnames.split(',') if name]
+        if len(dbnames) != 1:
+            parser.error("exactly one database is required (-d)")
+
+        self.running = True
+        self.store_ids = options.store_ids
+        # Signals are written to this pipe, so a stop wakes up select()
+        # at once instead of after the poll interval
+        self.wakeup_fd, wakeup_write_fd = os.pipe()
+        os.set_blocking(self.wakeup_fd, False)
+        os.set_blocking(wakeup_write_fd, False)
+        signal.set_wakeup_fd(wakeup_write_fd)
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        self._serve(dbnames[0], options.poll_interval)
+
+    def _stop(self, signum, frame):
+        _logger.info("SUNLUX ESL worker: stopping")
+        self.running = False
+
+    def _serve(self, dbname, poll_interval):
+        registry = Registry(dbname)
+        _logger.info("SUNLUX ESL worker: listening on %s/%s", dbname, NOTIFY_CHANNEL)
+        while self.running:
+            try:
+                with sql_db.db_connect(dbname).cursor() as listen_cr:
+                    listen_cr.execute(SQL("LISTEN %s", SQL.identifier(NOTIFY_CHANNEL)))
+                    listen_cr.commit()
+                    connection = listen_cr._cnx
+                    while self.running:
+                        registry = registry.check_signaling()
+                        wakeup = self._process(registry)
+                        timeout = poll_interval
+                        if wakeup:
+                            due_in = (wakeup - fields.Datetime.now()).total_seconds()
+                            timeout = min(timeout, max(due_in, 0))
+                        if self.running:
+                            self._wait(connection, timeout)
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                _logger.warning(
+                    "SUNLUX ESL worker: lost the database connection, reconnecting",
+                    exc_info=True,
+                )
+                self._wait(None, RECONNECT_DELAY)
+
+    def _wait(self, connection, timeout):
+        """Sleep until a notification or a signal arrives, or ``timeout``
+        seconds passed."""
+        watched = [self.wakeup_fd] + ([connection] if connection else [])
+        readable, _w, _x = select.select(watched, [], [], timeout)
+        if self.wakeup_fd in readable:
+            try:
+                while os.read(self.wakeup_fd, 512):
+                    pass
+            except BlockingIOError:
+                pass
+        if connection in readable:
+            connection.poll()
+            connection.notifies.clear()
+
+    def _process(self, registry):
+        """Drain the queue of every store served; return when work is next due."""
+        wakeups = []
+        if self.store_ids is None:
+            with registry.cursor() as cr:
+                env = api.Environment(cr, SUPERUSER_ID, {'sunlux_esl_worker': True})
+                store_ids = [None] + env['sunlux.esl.store'].search([]).ids
+        else:
+            store_ids = [store_id or None for store_id in self.store_ids]
+        for store_id in store_ids:
+            if not self.running:
+                break
+            with registry.cursor() as cr:
+                env = api.Environment(cr, SUPERUSER_ID, {'sunlux_esl_worker': True})
+                queue = env['sunlux.esl.sync.queue']
+                try:
+                    queue._cron_process_queue(store_id)
+                except Exception:
+                    cr.rollback()
+                    _logger.exception("SUNLUX ESL worker: queue of store %s failed", store_id)
+                wakeups.append(queue._get_next_wakeup(store_id))
+        wakeups = [wakeup for wakeup in wakeups if wakeup]
+        return min(wakeups) if wakeups else None
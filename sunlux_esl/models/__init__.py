@@ -1,5 +1,14 @@
 # -*- coding: utf-8 -*-
 from . import sunlux_esl_log
+from . import sunlux_esl_log_stats
+from . import sunlux_esl_log_report
 from . import sunlux_esl_api
+from . import sunlux_esl_circuit
+from . import sunlux_esl_store
+from . import sunlux_esl_sync_run
+from . import sunlux_esl_sync_queue
+from . import sunlux_esl_promotion
+from . import sunlux_esl_onboarding
 from . import product_template
+from . import stock_quant
 from . import res_config_settings
@@ -1,11 +1,49 @@
 # -*- coding: utf-8 -*-
+import hashlib
+import json
 import logging
-import threading
+from collections import defaultdict
+from datetime import timedelta
 
 from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+from odoo.tools import SQL
+
+from .sunlux_esl_circuit import SunluxEslCircuitOpen
 
 _logger = logging.getLogger(__name__)
 
+# Products enqueued per page (and commit) by the scheduled sync
+CRON_PAGE_SIZE = 1000
+
+# Stock propagation defaults: coalescing window and minimum change pushed
+DEFAULT_STOCK_WINDOW = 10           # minutes
+DEFAULT_STOCK_MIN_CHANGE = 1        # units
+
+# Mapped fields other than prices: changing one needs a light edit, while
+# a price change only needs the price endpoint
+ESL_LIGHT_FIELDS = {'name', 'barcode', 'default_code', 'uom_id', 'categ_id'}
+# Payload keys sent by a light edit, besides the goodsId
+ESL_LIGHT_KEYS = (
+    'goodsName', 'barCode', 'retailPrice', 'memberPrice', 'salePrice',
+    'salesUnit', 'sku', 'itemNo', 'category',
+)
+
+# From this many ESL products without a goodsId, the scheduled sync first
+# looks them up in the SUNLUX catalog instead of full-syncing them all
+RECONCILE_MIN_MISSING = 100
+
+
+def _esl_fingerprint(data):
+    """Stable hash of an ESL payload (or any JSON-serializable value)."""
+    raw = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _esl_light_data(data):
+    """The keys of a full-sync payload that a light edit sends."""
+    return {key: data[key] for key in ESL_LIGHT_KEYS}
+
 
 class ProductTemplate(models.Model):
     _inherit = 'product.template'
@@ -26,22 +64,80 @@ class ProductTemplate(models.Model):
     sunlux_last_sync = fields.Datetime(
         string='Last ESL Sync', readonly=True, copy=False,
     )
+    # Fingerprints of what was last accepted by SUNLUX — used to skip no-op
+    # pushes: the light-edit fields (prices included), and the prices alone
+    sunlux_payload_hash = fields.Char(
+        string='ESL Payload Fingerprint', readonly=True, copy=False,
+    )
+    sunlux_price_hash = fields.Char(
+        string='ESL Price Fingerprint', readonly=True, copy=False,
+    )
+    # Stock level last sent to SUNLUX, and whether quants moved since
+    sunlux_stock_synced = fields.Integer(
+        string='Last ESL Stock', readonly=True, copy=False,
+    )
+    sunlux_stock_dirty = fields.Boolean(
+        string='ESL Stock Outdated', readonly=True, copy=False,
+    )
+    sunlux_store_id = fields.Many2one(
+        'sunlux.esl.store', string='ESL Store', index='btree_not_null', ondelete='restrict',
+        help='SUNLUX store whose labels show this product. Leave empty to use '
+             'the credentials from Settings.',
+    )
+    sunlux_onboarding_id = fields.Many2one(
+        'sunlux.esl.onboarding', string='ESL Onboarding', index='btree_not_null',
+        ondelete='set null', readonly=True, copy=False,
+        help='Bulk onboarding that will send this product. Saves, the scheduled '
+             'sync and goodsId reconciliation leave it alone until then.',
+    )
+    sunlux_promotion_ids = fields.One2many(
+        'sunlux.esl.promotion', 'product_id', string='ESL Promotions',
+    )
+
+    # Covers exactly the candidates of the incremental scheduled sync
+    _sunlux_esl_outdated_idx = models.Index(
+        "(id) WHERE sunlux_esl_sync_enabled AND (sunlux_goods_id IS NULL"
+        " OR sunlux_last_sync IS NULL OR write_date > sunlux_last_sync)"
+    )
+    # Candidates of the stock propagation cron
+    _sunlux_stock_dirty_idx = models.Index("(id) WHERE sunlux_stock_dirty")
 
     # ------------------------------------------------------------------
-    # Write override — triggers background ESL sync
+    # Write override — queues the product for ESL sync
     # ------------------------------------------------------------------
 
     def write(self, vals):
+        if 'sunlux_store_id' in vals:
+            # goodsIds belong to the old store: start over in the new one
+            moved = self.filtered(lambda p: p.sunlux_store_id.id != vals['sunlux_store_id'])
+            moved.write({
+                'sunlux_goods_id': False, 'sunlux_last_sync': False,
+                'sunlux_payload_hash': False, 'sunlux_price_hash': False,
+            })
         result = super().write(vals)
 
         # Skip sync for our own internal field updates (avoid infinite loop)
-        esl_internal_fields = {'sunlux_goods_id', 'sunlux_last_sync'}
+        esl_internal_fields = {
+            'sunlux_goods_id', 'sunlux_last_sync',
+            'sunlux_payload_hash', 'sunlux_price_hash',
+            'sunlux_stock_synced', 'sunlux_stock_dirty', 'sunlux_onboarding_id',
+        }
         changed_fields = set(vals) - esl_internal_fields
         if not changed_fields:
             return result
 
-        # When auto-sync is ON, sync on ANY save (not just specific fields)
-        products = self.filtered('sunlux_esl_sync_enabled')
+        # Mapped fields other than prices need a light edit. Otherwise only
+        # queue products whose prices differ from what SUNLUX last accepted
+        # (edits to descriptions, notes, ... are no-ops). Products waiting
+        # for a bulk onboarding are sent by its replay.
+        products = self.filtered(
+            lambda p: p.sunlux_esl_sync_enabled and not p.sunlux_onboarding_id
+        )
+        if changed_fields & ESL_LIGHT_FIELDS:
+            sync_mode = 'light'
+        else:
+            sync_mode = 'price'
+            products = products._filter_esl_changed()
         if products:
             product_ids = products.ids
             product_names = ', '.join(p.name for p in products)
@@ -62,142 +158,877 @@ class ProductTemplate(models.Model):
                 },
             )
 
-            # Start sync AFTER the current transaction commits
-            # (prevents concurrent update errors)
-            def _start_sync():
-                import time as _time
-                _time.sleep(1)  # small debounce
-                thread = threading.Thread(
-                    target=self._sync_to_esl_background,
-                    args=(product_ids,),
-                    daemon=True,
-                )
-                thread.start()
-
-            self.env.cr.postcommit.add(_start_sync)
+            # Queued in this transaction: nothing is sent if the save rolls
+            # back, and the queue cron only sees it once it commits.
+            self.env['sunlux.esl.sync.queue']._enqueue(product_ids, sync_mode, edited=True)
 
         return result
 
     # ------------------------------------------------------------------
-    # Background sync (runs in its own DB cursor)
+    # Sync (called by the queue cron)
     # ------------------------------------------------------------------
 
-    def _sync_to_esl_background(self, product_ids):
-        """Thread entry-point — opens a fresh cursor and runs sync."""
-        try:
-            with self.pool.cursor() as cr:
-                env = api.Environment(cr, self.env.uid, self.env.context)
-                products = env['product.template'].browse(product_ids).exists()
-                if products:
-                    products._do_esl_sync(env)
-                cr.commit()
-        except Exception:
-            _logger.exception("SUNLUX ESL: background sync failed")
-
-    def _do_esl_sync(self, env):
-        """Decide full-sync vs price-sync and call the API."""
-        api_client = env['sunlux.esl.api']
-
-        new_products = self.filtered(lambda p: not p.sunlux_goods_id)
-        existing_products = self.filtered(lambda p: p.sunlux_goods_id)
-
-        # --- Full sync for products without a SUNLUX goodsId ----
-        if new_products:
-            payload = [
-                new_products._prepare_full_sync_data(p) for p in new_products
-            ]
-            result = api_client.sync_products_full(
-                payload,
-                product_ids=new_products.ids,
-                product_names=[p.name for p in new_products],
+    def _do_esl_sync(self, env, sync_modes=None):
+        """Sync the products of each SUNLUX store with its own credentials.
+
+        :param sync_modes: dict {product id: 'price' | 'light' | 'full'}, what
+                           changed on each product; 'price' if missing
+        :return: dict {product id: error reason} of the products SUNLUX did
+                 not accept, for the queue to retry
+        """
+        failures = {}
+        for store, products in self.grouped('sunlux_store_id').items():
+            failures.update(
+                products._do_esl_sync_store(
+                    env, env['sunlux.esl.api']._for_store(store), sync_modes or {},
+                )
             )
-            for item in result.get('suc', []):
-                barcode = item.get('barCode')
-                goods_id = item.get('goodsId')
-                if barcode and goods_id:
-                    matched = new_products.filtered(
-                        lambda p, bc=barcode: p.barcode == bc
-                    )
-                    if matched:
-                        matched.write({
-                            'sunlux_goods_id': goods_id,
-                            'sunlux_last_sync': fields.Datetime.now(),
+        return failures
+
+    def _do_esl_sync_store(self, env, api_client, sync_modes):
+        """Route each product to the lightest call that carries its change.
+
+        - full edit: products without a goodsId (they are created), products
+          queued for a full push, and products with a published promotion —
+          the only call carrying its window;
+        - light edit: products whose mapped fields other than prices changed,
+          skipped if what it sends matches the last accepted payload;
+        - price sync: the rest, skipped if their price fingerprint matches
+          the last accepted one.
+
+        Skipped products are only stamped as synced.
+
+        Each call is batched separately.
+
+        Products are streamed in windows of one request each — read, built,
+        sent, matched, written back and evicted from the cache — so memory
+        stays flat however many products are synced: only the windows in
+        flight are held at a time.
+
+        :return: dict {product id: error reason} of the products sent but
+                 not acknowledged
+        """
+        run_model = env['sunlux.esl.sync.run']
+        size = api_client._get_chunk_size()
+
+        full_ids, light_ids, price_ids, unchanged_ids = [], [], [], []
+        with run_model._phase('fetch'):
+            for window in self._iter_esl_windows(size):
+                for product in window:
+                    sync_mode = sync_modes.get(product.id, 'price')
+                    if not product.sunlux_goods_id or sync_mode == 'full':
+                        full_ids.append(product.id)
+                    elif (sync_mode == 'price'
+                          and product.sunlux_price_hash == product._get_esl_price_hash()):
+                        unchanged_ids.append(product.id)
+                    elif product._get_esl_promotion():
+                        full_ids.append(product.id)
+                    elif sync_mode == 'light':
+                        light_ids.append(product.id)
+                    else:
+                        price_ids.append(product.id)
+                window.invalidate_recordset()
+
+        # One timestamp per run, written back in a single write() per
+        # window. The transaction time is also what that write stamps as
+        # write_date, so synced products drop out of the incremental cron's
+        # candidates.
+        now = env.cr.now()
+        self._write_esl_sync_results(now, dict.fromkeys(unchanged_ids, {}))
+        failures = {}
+        if full_ids:
+            failures.update(self.browse(full_ids)._stream_esl_full_sync(api_client, size, now))
+        if light_ids:
+            failures.update(self.browse(light_ids)._stream_esl_light_sync(api_client, size, now))
+        if price_ids:
+            failures.update(self.browse(price_ids)._stream_esl_price_sync(api_client, size, now))
+        return failures
+
+    def _iter_esl_windows(self, size):
+        """Yield ``self`` in slices of ``size`` records, each prefetching
+        only its own records."""
+        for start in range(0, len(self), size):
+            yield self.browse(self._ids[start:start + size])
+
+    def _stream_esl_full_sync(self, api_client, size, now):
+        """Full sync for products without a SUNLUX goodsId (or promoted).
+
+        :return: dict {product id: error reason}
+        """
+        run_model = self.env['sunlux.esl.sync.run']
+        name_cache = {}
+
+        def chunks():
+            for window in self._iter_esl_windows(size):
+                with run_model._phase('build'):
+                    payload = window._prepare_full_sync_batch(name_cache)
+                yield payload, window.ids, window.mapped('name')
+
+        failures = {}
+        for (payload, ids, _names), result in api_client.iter_sync_products_full(chunks()):
+            failures.update(self.browse(ids)._apply_esl_full_sync_result(payload, result, now))
+        return failures
+
+    def _apply_esl_full_sync_result(self, payload, result, now, price_hashes=None):
+        """Write back the result of a full sync of ``self``.
+
+        ``payload`` is aligned with ``self``. ``price_hashes`` ({product id:
+        price fingerprint}) is given for payloads built earlier, whose prices
+        may have changed since; otherwise the current fingerprints are used.
+        The records are evicted from the cache once written.
+
+        :return: dict {product id: error reason}
+        """
+        run_model = self.env['sunlux.esl.sync.run']
+        with run_model._phase('match'):
+            matched = self._match_sync_result('sync_product', result, 'barcode', 'barCode')
+            failures = self._get_esl_failures(matched, result, 'barcode', 'barCode')
+            write_back, stock = {}, {}
+            for product, data in zip(self, payload):
+                if product in matched:
+                    write_back[product.id] = {
+                        'sunlux_goods_id': matched[product]['goodsId'],
+                        'sunlux_payload_hash': _esl_fingerprint(_esl_light_data(data)),
+                        'sunlux_price_hash': (
+                            price_hashes[product.id] if price_hashes
+                            else product._get_esl_price_hash()
+                        ),
+                    }
+                    stock[product.id] = data['stock']
+        with run_model._phase('write'):
+            self._write_esl_sync_results(now, write_back)
+            self._store_esl_stock(stock)
+            self.invalidate_recordset()
+        return failures
+
+    def _stream_esl_light_sync(self, api_client, size, now):
+        """Light edit of the mapped fields of already-synced products.
+
+        :return: dict {product id: error reason}
+        """
+        run_model = self.env['sunlux.esl.sync.run']
+        name_cache = {}
+
+        unchanged = []
+
+        def chunks():
+            for window in self._iter_esl_windows(size):
+                with run_model._phase('build'):
+                    payload, ids, names = [], [], []
+                    for product, data in zip(window, window._prepare_full_sync_batch(name_cache)):
+                        data = _esl_light_data(data)
+                        # Saves that put back what the tag already shows
+                        if product.sunlux_payload_hash == _esl_fingerprint(data):
+                            unchanged.append(product.id)
+                            continue
+                        payload.append(dict(data, goodsId=product.sunlux_goods_id))
+                        ids.append(product.id)
+                        names.append(product.name)
+                if ids:
+                    yield payload, ids, names
+
+        failures = {}
+        for (payload, ids, _names), result in api_client.iter_sync_products_light(chunks()):
+            window = self.browse(ids)
+            with run_model._phase('match'):
+                matched = window._match_sync_result(
+                    'sync_light', result, 'sunlux_goods_id', 'goodsId',
+                )
+                failures.update(window._get_esl_failures(
+                    matched, result, 'sunlux_goods_id', 'goodsId',
+                ))
+            with run_model._phase('write'):
+                self._write_esl_sync_results(now, {
+                    product.id: {
+                        'sunlux_payload_hash': _esl_fingerprint(_esl_light_data(data)),
+                        'sunlux_price_hash': product._get_esl_price_hash(),
+                    }
+                    for product, data in zip(window, payload)
+                    if product in matched
+                })
+                window.invalidate_recordset()
+        # Nothing to send, but nothing left to sync either
+        self._write_esl_sync_results(now, dict.fromkeys(unchanged, {}))
+        return failures
+
+    def _stream_esl_price_sync(self, api_client, size, now):
+        """Price-only sync for already-synced products.
+
+        :return: dict {product id: error reason}
+        """
+        run_model = self.env['sunlux.esl.sync.run']
+
+        def chunks():
+            for window in self._iter_esl_windows(size):
+                with run_model._phase('build'):
+                    payload = []
+                    for p in window:
+                        retail, sale = p._get_esl_prices()
+                        payload.append({
+                            'goodsId': p.sunlux_goods_id,
+                            'retailPrice': retail,
+                            'memberPrice': sale,
+                            'salePrice': sale,
                         })
+                yield payload, window.ids, window.mapped('name')
 
-        # --- Price-only sync for already-synced products ---------
-        if existing_products:
-            payload = []
-            for p in existing_products:
-                original = p.sunlux_original_price or 0
-                has_discount = original and original > p.list_price
-                retail = original if has_discount else p.list_price
-                sale = p.list_price
-                payload.append({
-                    'goodsId': p.sunlux_goods_id,
-                    'retailPrice': retail,
-                    'memberPrice': sale,
-                    'salePrice': sale,
+        failures = {}
+        for (_payload, ids, _names), result in api_client.iter_sync_prices(chunks()):
+            window = self.browse(ids)
+            with run_model._phase('match'):
+                matched = window._match_sync_result(
+                    'sync_price', result, 'sunlux_goods_id', 'goodsId',
+                )
+                failures.update(window._get_esl_failures(
+                    matched, result, 'sunlux_goods_id', 'goodsId',
+                ))
+            with run_model._phase('write'):
+                self._write_esl_sync_results(now, {
+                    product.id: {'sunlux_price_hash': product._get_esl_price_hash()}
+                    for product in matched
                 })
-            result = api_client.sync_prices(
-                payload,
-                product_ids=existing_products.ids,
-                product_names=[p.name for p in existing_products],
-            )
-            for item in result.get('suc', []):
-                goods_id = item.get('goodsId')
-                if goods_id:
-                    matched = existing_products.filtered(
-                        lambda p, gid=goods_id: p.sunlux_goods_id == gid
-                    )
-                    if matched:
-                        matched.write({'sunlux_last_sync': fields.Datetime.now()})
+                window.invalidate_recordset()
+        return failures
 
     # ------------------------------------------------------------------
-    # Field mapping helper
+    # Result reconciliation
     # ------------------------------------------------------------------
 
-    @staticmethod
-    def _prepare_full_sync_data(product):
-        """Map an Odoo product to the SUNLUX full-sync payload.
+    def _match_sync_result(self, operation, result, field_name, item_key):
+        """Pair the ``suc`` items of an API result with products in ``self``.
+
+        ``self`` is indexed once on ``field_name`` (barcode or goodsId), so
+        matching is linear in the batch size. Items whose key matches no
+        product, and keys that are ambiguous (returned twice, or shared by
+        several products), are reported in the log and left unmatched so the
+        next sync retries them.
+
+        :return: dict {product: suc item}
+        """
+        products_by_key = defaultdict(list)
+        for product in self:
+            key = product[field_name]
+            if key:
+                products_by_key[key].append(product)
+
+        items_by_key = defaultdict(list)
+        for item in result.get('suc', []):
+            key = item.get(item_key)
+            if key and item.get('goodsId'):
+                items_by_key[key].append(item)
+
+        matched = {}
+        unmatched, duplicates = [], []
+        for key, items in items_by_key.items():
+            products = products_by_key.get(key)
+            if not products:
+                unmatched.append(key)
+            elif len(items) > 1 or len(products) > 1:
+                duplicates.append(key)
+            else:
+                matched[products[0]] = items[0]
+
+        if unmatched or duplicates:
+            self._report_unmatched_results(operation, item_key, unmatched, duplicates)
+        return matched
+
+    def _get_esl_failures(self, matched, result, field_name, item_key):
+        """Return {product id: error reason} for products of ``self`` missing
+        from ``matched``.
+
+        Reasons come from the ``msg`` items naming the product (by
+        ``item_key``); products without one get the chunk-level errors
+        (timeouts, HTTP errors) or a generic reason.
+        """
+        failed = self.filtered(lambda p: p not in matched)
+        if not failed:
+            return {}
+        reasons, general = {}, []
+        for msg in result.get('msg') or []:
+            if isinstance(msg, dict) and msg.get(item_key):
+                reasons[msg[item_key]] = str(msg.get('msg') or msg)
+            elif msg:
+                general.append(str(msg))
+        fallback = '; '.join(dict.fromkeys(general)) or 'Not acknowledged by SUNLUX'
+        return {p.id: reasons.get(p[field_name], fallback) for p in failed}
+
+    @api.model
+    def _report_unmatched_results(self, operation, item_key, unmatched, duplicates):
+        """Log returned keys that could not be written back."""
+        parts = []
+        if unmatched:
+            parts.append("%d %s value(s) not matching any synced product: %s" % (
+                len(unmatched), item_key, ', '.join(unmatched),
+            ))
+        if duplicates:
+            parts.append("%d duplicated %s value(s) skipped: %s" % (
+                len(duplicates), item_key, ', '.join(duplicates),
+            ))
+        message = '\n'.join(parts)
+        _logger.warning("SUNLUX ESL %s: %s", operation, message)
+        self.env['sunlux.esl.log'].log_api_call(
+            operation=operation,
+            endpoint=None,
+            request_data=None,
+            response_code=None,
+            response_data={'unmatched': unmatched, 'duplicates': duplicates},
+            error_message=message,
+            status='warning',
+        )
+
+    @api.model
+    def _write_esl_sync_results(self, now, vals_by_product_id):
+        """Write back sync results: the shared timestamp in one ``write()``,
+        the per-product values in one statement.
+
+        :param now: sync time of every product of ``vals_by_product_id``
+        :param vals_by_product_id: dict {product id: {field name: value}},
+                                   the same Char fields for every product
+        """
+        if not vals_by_product_id:
+            return
+        product_ids = list(vals_by_product_id)
+        # Through the ORM, so write_date is stamped with the same time
+        self.browse(product_ids).write({'sunlux_last_sync': now})
+        fnames = sorted(next(iter(vals_by_product_id.values())))
+        if not fnames:
+            return
+        self.env.cr.execute(SQL(
+            """
+            UPDATE product_template t SET %(assignments)s
+              FROM unnest(%(ids)s::int[], %(columns)s) AS v(id, %(fnames)s)
+             WHERE t.id = v.id
+            """,
+            assignments=SQL(", ").join(
+                SQL("%s = v.%s", SQL.identifier(fname), SQL.identifier(fname))
+                for fname in fnames
+            ),
+            ids=product_ids,
+            columns=SQL(", ").join(
+                SQL("%s::varchar[]", [vals[fname] or None for vals in vals_by_product_id.values()])
+                for fname in fnames
+            ),
+            fnames=SQL(", ").join(SQL.identifier(fname) for fname in fnames),
+        ))
+        self.browse(product_ids).invalidate_recordset(fnames)
+
+    # ------------------------------------------------------------------
+    # Change detection
+    # ------------------------------------------------------------------
+
+    def _get_esl_prices(self):
+        """Return ``(retail_price, sale_price)`` as shown on the ESL tag.
 
-        Price logic:
         - If sunlux_original_price is set and higher than list_price,
           retailPrice = original price, salePrice = list_price (discounted).
         - Otherwise, retailPrice = salePrice = list_price.
         """
-        original = product.sunlux_original_price or 0
-        has_discount = original and original > product.list_price
-        retail_price = original if has_discount else product.list_price
-        sale_price = product.list_price
+        self.ensure_one()
+        return self._compute_esl_prices(self.list_price, self.sunlux_original_price)
 
-        return {
-            'goodsName': product.name or '',
-            'barCode': product.barcode or '',
-            'retailPrice': retail_price,
-            'memberPrice': sale_price,
-            'salePrice': sale_price,
-            'salesUnit': product.uom_id.name if product.uom_id else 'Unit',
-            'sku': product.default_code or '',
-            'itemNo': product.default_code or '',
-            'category': product.categ_id.name if product.categ_id else '',
-            'stock': int(product.qty_available) if hasattr(product, 'qty_available') else 0,
-            'qrcodeUrl': '',
-            'goodsPhoto': '',
-            'specif': '',
-            'grade': '',
-            'origin': '',
-            'model': '',
-            'promotionBegin': '',
-            'promotionEnd': '',
-            'productionDate': '',
-            'warehouse': '',
-            'freightSpace': '',
-            'shelfLife': '',
-            'mode': '',
-            'supplier': '',
-            'department': '',
-            'extendParams': '',
-        }
+    @staticmethod
+    def _compute_esl_prices(list_price, original_price):
+        """Price logic of ``_get_esl_prices`` on plain values."""
+        original = original_price or 0
+        has_discount = original and original > list_price
+        retail_price = original if has_discount else list_price
+        return retail_price, list_price
+
+    def _get_esl_price_hash(self):
+        """Fingerprint of the (retail, member, sale) price tuple and of the
+        published promotion, if any."""
+        retail_price, sale_price = self._get_esl_prices()
+        promotion = self._get_esl_promotion()
+        if not promotion:
+            return _esl_fingerprint([retail_price, sale_price, sale_price])
+        return _esl_fingerprint([
+            retail_price, sale_price, sale_price,
+            promotion.promo_price, promotion.date_begin, promotion.date_end,
+        ])
+
+    def _get_esl_promotion(self):
+        """Return the promotion currently published for this product, if any."""
+        self.ensure_one()
+        return self.sunlux_promotion_ids.filtered(lambda p: p.state == 'published')[:1]
+
+    def _get_esl_timezone(self):
+        """Timezone of the labels showing this product: its store's, else
+        its company's, else UTC."""
+        self.ensure_one()
+        company = self.company_id or self.env.company
+        return self.sunlux_store_id.tz or company.partner_id.tz or 'UTC'
+
+    def _format_esl_datetime(self, value):
+        """Format a UTC datetime in the timezone of the product's labels, as
+        SUNLUX expects — whoever happens to trigger the sync."""
+        return fields.Datetime.context_timestamp(
+            self.with_context(tz=self._get_esl_timezone()), value,
+        ).strftime('%Y-%m-%d %H:%M:%S')
+
+    def _filter_esl_changed(self):
+        """Keep products that need a push: never synced, or price changed.
+
+        Only prices are sent to products that already have a goodsId, so the
+        price fingerprint decides for them. Manual "Sync Now" clears the
+        fingerprint to force a push.
+        """
+        return self.filtered(
+            lambda p: not p.sunlux_goods_id
+            or p.sunlux_price_hash != p._get_esl_price_hash()
+        )
+
+    # ------------------------------------------------------------------
+    # Field mapping helpers
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _prepare_full_sync_data(product):
+        """Map a single Odoo product to the SUNLUX full-sync payload."""
+        return product._prepare_full_sync_batch()[0]
+
+    def _prepare_full_sync_batch(self, name_cache=None):
+        """Map every product of ``self`` to its SUNLUX full-sync payload.
+
+        Set-based: product columns come from a single ``read``, stock from
+        one grouped quant query, and UoM / category names from
+        ``name_cache`` — a dict {(model, id): name} that callers building
+        several batches in one run can pass in to share.
+
+        See ``_get_esl_prices`` for the price logic.
+
+        :return: list of payload dicts, in the order of ``self``
+        """
+        if not self:
+            return []
+        if name_cache is None:
+            name_cache = {}
+        rows = self.read([
+            'name', 'barcode', 'list_price', 'sunlux_original_price',
+            'default_code', 'uom_id', 'categ_id',
+        ], load=None)
+        uom_names = self._get_esl_names('uom.uom', {r['uom_id'] for r in rows}, name_cache)
+        categ_names = self._get_esl_names(
+            'product.category', {r['categ_id'] for r in rows}, name_cache,
+        )
+        stock = self._get_esl_stock()
+
+        payload = []
+        for product, row in zip(self, rows):
+            retail_price, sale_price = self._compute_esl_prices(
+                row['list_price'], row['sunlux_original_price'],
+            )
+            # A published promotion sets the sale price for its window only;
+            # outside of it the tag shows the retail price
+            promotion = product._get_esl_promotion()
+            if promotion:
+                sale_price = promotion.promo_price
+                promotion_begin = product._format_esl_datetime(promotion.date_begin)
+                promotion_end = product._format_esl_datetime(promotion.date_end)
+            else:
+                promotion_begin = promotion_end = ''
+            payload.append({
+                'goodsName': row['name'] or '',
+                'barCode': row['barcode'] or '',
+                'retailPrice': retail_price,
+                'memberPrice': sale_price,
+                'salePrice': sale_price,
+                'salesUnit': uom_names.get(row['uom_id']) or 'Unit',
+                'sku': row['default_code'] or '',
+                'itemNo': row['default_code'] or '',
+                'category': categ_names.get(row['categ_id']) or '',
+                'stock': int(stock.get(row['id'], 0)),
+                'qrcodeUrl': '',
+                'goodsPhoto': '',
+                'specif': '',
+                'grade': '',
+                'origin': '',
+                'model': '',
+                'promotionBegin': promotion_begin,
+                'promotionEnd': promotion_end,
+                'productionDate': '',
+                'warehouse': '',
+                'freightSpace': '',
+                'shelfLife': '',
+                'mode': '',
+                'supplier': '',
+                'department': '',
+                'extendParams': '',
+            })
+        return payload
+
+    @api.model
+    def _get_esl_names(self, model_name, record_ids, name_cache):
+        """Return {id: name} for ``record_ids``, reading only cache misses."""
+        record_ids = {rid for rid in record_ids if rid}
+        missing = [rid for rid in record_ids if (model_name, rid) not in name_cache]
+        if missing:
+            for rec in self.env[model_name].browse(missing).read(['name']):
+                name_cache[(model_name, rec['id'])] = rec['name']
+        return {rid: name_cache.get((model_name, rid)) for rid in record_ids}
+
+    def _get_esl_stock(self):
+        """Return {template id: on-hand quantity} with one grouped quant query.
+
+        Mirrors ``qty_available`` without warehouse/location context: quants
+        in internal and transit locations of the allowed companies.
+        """
+        groups = self.env['stock.quant']._read_group(
+            [
+                ('product_id.product_tmpl_id', 'in', self.ids),
+                ('location_id.usage', 'in', ('internal', 'transit')),
+                ('company_id', 'in', self.env.companies.ids),
+            ],
+            ['product_id'],
+            ['quantity:sum'],
+        )
+        stock = defaultdict(float)
+        for product, quantity in groups:
+            stock[product.product_tmpl_id.id] += quantity
+        return stock
+
+    # ------------------------------------------------------------------
+    # Scheduled sync
+    # ------------------------------------------------------------------
+
+    @api.model
+    def _cron_sunlux_esl_sync(self, full=False):
+        """Queue ESL-enabled products for sync, one page at a time.
+
+        Incremental (default): only products never synced, without a goodsId,
+        or written since their last sync — then filtered by fingerprint, so
+        products whose ESL data is unchanged are not queued, only stamped as
+        synced so the next run does not pick them again.
+        Full (``full=True``): every ESL-enabled product is pushed again.
+        Products waiting for a bulk onboarding are left to its replay.
+
+        When many products lack a goodsId (restored or copied database,
+        reinstalled module), their goodsIds are first looked up in the SUNLUX
+        catalog, so only the truly missing ones take the full-sync path.
+        """
+        for store in self._get_esl_stores():
+            if len(self._get_esl_missing_goods_ids(store)) < RECONCILE_MIN_MISSING:
+                continue
+            try:
+                self._sunlux_esl_reconcile_goods(store)
+            except UserError as exc:
+                _logger.warning("SUNLUX ESL: goodsId reconciliation skipped — %s", exc)
+        if full:
+            condition = SQL("TRUE")
+        else:
+            condition = SQL(
+                "(sunlux_goods_id IS NULL OR sunlux_last_sync IS NULL"
+                " OR write_date > sunlux_last_sync)"
+            )
+        queue = self.env['sunlux.esl.sync.queue']
+        last_id = 0
+        queued = 0
+        while True:
+            self.env.cr.execute(SQL(
+                """
+                SELECT id FROM product_template
+                 WHERE sunlux_esl_sync_enabled AND sunlux_onboarding_id IS NULL
+                   AND %(condition)s AND id > %(last_id)s
+                 ORDER BY id
+                 LIMIT %(limit)s
+                """,
+                condition=condition, last_id=last_id, limit=CRON_PAGE_SIZE,
+            ))
+            ids = [row[0] for row in self.env.cr.fetchall()]
+            if not ids:
+                break
+            last_id = ids[-1]
+            products = self.browse(ids)
+            if full:
+                # Forget the fingerprints so nothing is skipped as a no-op
+                products.write({'sunlux_price_hash': False})
+            else:
+                changed = products._filter_esl_changed()
+                # Stamp the unchanged ones so later runs stop looking at them
+                (products - changed).write({'sunlux_last_sync': self.env.cr.now()})
+                products = changed
+            queue._enqueue(products.ids, 'full' if full else 'price')
+            queued += len(products)
+            self.env.cr.commit()
+            # Keep memory flat across pages
+            self.env.invalidate_all()
+        _logger.info(
+            "SUNLUX ESL: scheduled %s sync queued %d product(s)",
+            'full' if full else 'incremental', queued,
+        )
+
+    # ------------------------------------------------------------------
+    # Stock propagation
+    # ------------------------------------------------------------------
+
+    @api.model
+    def _mark_esl_stock_dirty(self, template_ids):
+        """Flag synced ESL products whose quants moved, and schedule a push.
+
+        Raw SQL so stock moves neither bump ``write_date`` nor lock rows that
+        are already flagged. The push is scheduled once per window: only
+        when a product goes from clean to dirty.
+        """
+        if not template_ids:
+            return
+        self.env.cr.execute(SQL(
+            """
+            UPDATE product_template SET sunlux_stock_dirty = TRUE
+             WHERE id = ANY(%(ids)s)
+               AND sunlux_esl_sync_enabled
+               AND sunlux_goods_id IS NOT NULL
+               AND sunlux_stock_dirty IS NOT TRUE
+            RETURNING id
+            """,
+            ids=list(template_ids),
+        ))
+        flagged = [row[0] for row in self.env.cr.fetchall()]
+        if not flagged:
+            return
+        self.browse(flagged).invalidate_recordset(['sunlux_stock_dirty'])
+        window = self.env['sunlux.esl.api']._get_int_param(
+            'sunlux_esl.stock_window_minutes', DEFAULT_STOCK_WINDOW, minimum=0,
+        )
+        self.env.ref('sunlux_esl.ir_cron_sunlux_esl_stock').sudo()._trigger(
+            fields.Datetime.now() + timedelta(minutes=window),
+        )
+
+    def _store_esl_stock(self, stock_by_id):
+        """Record the stock levels accepted by SUNLUX, in one statement."""
+        if not stock_by_id:
+            return
+        self.env.cr.execute(SQL(
+            """
+            UPDATE product_template t SET sunlux_stock_synced = s.stock
+              FROM unnest(%(ids)s::int[], %(stock)s::int[]) AS s(id, stock)
+             WHERE t.id = s.id
+            """,
+            ids=list(stock_by_id), stock=list(stock_by_id.values()),
+        ))
+        self.browse(list(stock_by_id)).invalidate_recordset(['sunlux_stock_synced'])
+
+    def _cron_sunlux_esl_push_stock(self):
+        """Push the coalesced stock of flagged products, one page at a time.
+
+        Flags are cleared and committed before the stock is read, so a move
+        that lands during the push flags the product again instead of being
+        lost, and no product row stays locked during the HTTP calls.
+        Changes smaller than the minimum are not pushed, except when the
+        product runs out of stock or comes back. Pages move forward by id, so
+        products flagged again by a failed push wait for the next run; while
+        a store's circuit breaker is open, the run stops and is rescheduled
+        for the probe.
+        """
+        min_change = self.env['sunlux.esl.api']._get_int_param(
+            'sunlux_esl.stock_min_change', DEFAULT_STOCK_MIN_CHANGE, minimum=1,
+        )
+        pushed = 0
+        last_id = 0
+        while True:
+            self.env.cr.execute(SQL(
+                """
+                UPDATE product_template SET sunlux_stock_dirty = FALSE
+                 WHERE id IN (SELECT id FROM product_template
+                               WHERE sunlux_stock_dirty AND id > %(after)s
+                               ORDER BY id
+                               LIMIT %(limit)s
+                               FOR UPDATE SKIP LOCKED)
+                RETURNING id
+                """,
+                after=last_id, limit=CRON_PAGE_SIZE,
+            ))
+            ids = sorted(row[0] for row in self.env.cr.fetchall())
+            if not ids:
+                break
+            last_id = ids[-1]
+            products = self.browse(ids)
+            products.invalidate_recordset(['sunlux_stock_dirty'])
+            # Commit first: the stock is read in a new snapshot, so a move
+            # committed after it flags the product again
+            self.env.cr.commit()
+            stock = products._get_esl_stock()
+
+            to_push = {}
+            for product in products.filtered(lambda p: p.sunlux_esl_sync_enabled and p.sunlux_goods_id):
+                qty = int(stock.get(product.id, 0))
+                last = product.sunlux_stock_synced
+                if abs(qty - last) >= min_change or (qty > 0) != (last > 0):
+                    to_push[product] = qty
+            pending = dict(to_push)
+            try:
+                for store, store_products in products.grouped('sunlux_store_id').items():
+                    stock_by_product = {p: to_push[p] for p in store_products if p in to_push}
+                    if stock_by_product:
+                        pushed += store_products._push_esl_stock(store, stock_by_product)
+                    for product in stock_by_product:
+                        del pending[product]
+            except SunluxEslCircuitOpen as exc:
+                # Keep the unsent products flagged and come back for the probe
+                self.env.cr.execute(SQL(
+                    "UPDATE product_template SET sunlux_stock_dirty = TRUE WHERE id = ANY(%s)",
+                    [product.id for product in pending],
+                ))
+                cron = self.env.ref('sunlux_esl.ir_cron_sunlux_esl_stock', raise_if_not_found=False)
+                if cron:
+                    cron.sudo()._trigger(exc.retry_at)
+                self.env.cr.commit()
+                _logger.info("SUNLUX ESL: circuit open, stock propagation stopped")
+                break
+            self.env.cr.commit()
+            self.env.invalidate_all()
+        _logger.info("SUNLUX ESL: stock propagation pushed %d product(s)", pushed)
+
+    def _push_esl_stock(self, store, stock_by_product):
+        """Send ``{product: stock}`` to ``store`` with light edits; flag
+        failures again."""
+        products = self.browse([p.id for p in stock_by_product])
+        result = self.env['sunlux.esl.api']._for_store(store).sync_stock(
+            [{
+                'goodsId': product.sunlux_goods_id,
+                'barCode': product.barcode or '',
+                'stock': qty,
+            } for product, qty in stock_by_product.items()],
+            product_ids=products.ids,
+            product_names=[p.name for p in products],
+        )
+        matched = products._match_sync_result('sync_stock', result, 'sunlux_goods_id', 'goodsId')
+        self._store_esl_stock({product.id: stock_by_product[product] for product in matched})
+        failed = [product.id for product in products if product not in matched]
+        if failed:
+            self.env.cr.execute(SQL(
+                "UPDATE product_template SET sunlux_stock_dirty = TRUE WHERE id = ANY(%s)",
+                failed,
+            ))
+            self.browse(failed).invalidate_recordset(['sunlux_stock_dirty'])
+        return len(matched)
+
+    # ------------------------------------------------------------------
+    # goodsId reconciliation
+    # ------------------------------------------------------------------
+
+    @api.model
+    def _get_esl_stores(self):
+        """Active stores, preceded by an empty one standing for Settings."""
+        stores = self.env['sunlux.esl.store'].sudo()
+        return [stores] + list(stores.search([]))
+
+    @api.model
+    def _esl_store_condition(self, store, alias='product_template'):
+        """SQL condition selecting the products of ``store``."""
+        column = SQL.identifier(alias, 'sunlux_store_id')
+        if store:
+            return SQL("%s = %s", column, store.id)
+        return SQL("%s IS NULL", column)
+
+    def _get_esl_missing_goods_ids(self, store):
+        """Ids of ESL-enabled templates of ``store`` that have no SUNLUX goodsId,
+        except those a bulk onboarding is about to send, and those without a
+        barcode (a single active variant carrying one): SUNLUX results are
+        matched by barcode, so they can never get a goodsId. Products in
+        Failed Syncs are left to be retried from there."""
+        self.env.cr.execute(SQL(
+            """
+            SELECT t.id FROM product_template t
+             WHERE t.sunlux_esl_sync_enabled AND t.sunlux_goods_id IS NULL
+               AND t.sunlux_onboarding_id IS NULL AND %s
+               AND NOT EXISTS (SELECT 1 FROM sunlux_esl_sync_queue q
+                                WHERE q.product_id = t.id AND q.state = 'failed')
+               AND EXISTS (SELECT 1 FROM product_product p
+                            WHERE p.product_tmpl_id = t.id AND p.active
+                              AND COALESCE(p.barcode, '') != ''
+                              AND NOT EXISTS (SELECT 1 FROM product_product o
+                                               WHERE o.product_tmpl_id = t.id
+                                                 AND o.active AND o.id != p.id))
+             ORDER BY t.id
+            """,
+            self._esl_store_condition(store, 't'),
+        ))
+        return [row[0] for row in self.env.cr.fetchall()]
+
+    def _sunlux_esl_reconcile_goods(self, store):
+        """Backfill missing goodsIds of ``store`` from its goods list, by barcode.
+
+        Pages through the whole catalog; each page is matched in a single
+        UPDATE and committed. Only templates with one active variant carry a
+        barcode, as in the full-sync payload. Matched products get their
+        price fingerprint cleared, so their next sync is a price push instead
+        of a full one. Returns the number of products matched.
+        """
+        matched = 0
+        for rows in self.env['sunlux.esl.api']._for_store(store).iter_goods():
+            goods_by_barcode = {
+                row['barCode']: row['goodsId']
+                for row in rows if row.get('barCode') and row.get('goodsId')
+            }
+            if not goods_by_barcode:
+                continue
+            self.env.cr.execute(SQL(
+                """
+                UPDATE product_template t
+                   SET sunlux_goods_id = m.goods_id,
+                       sunlux_price_hash = NULL
+                  FROM product_product p
+                  JOIN unnest(%(barcodes)s::varchar[], %(goods_ids)s::varchar[])
+                       AS m(barcode, goods_id) ON m.barcode = p.barcode
+                 WHERE p.product_tmpl_id = t.id
+                   AND p.active
+                   AND t.sunlux_esl_sync_enabled
+                   AND t.sunlux_goods_id IS NULL
+                   AND t.sunlux_onboarding_id IS NULL
+                   AND %(store)s
+                   AND NOT EXISTS (SELECT 1 FROM product_product o
+                                    WHERE o.product_tmpl_id = t.id
+                                      AND o.active AND o.id != p.id)
+                RETURNING t.id
+                """,
+                barcodes=list(goods_by_barcode),
+                goods_ids=list(goods_by_barcode.values()),
+                store=self._esl_store_condition(store, 't'),
+            ))
+            ids = [row[0] for row in self.env.cr.fetchall()]
+            self.browse(ids).invalidate_recordset(['sunlux_goods_id', 'sunlux_price_hash'])
+            matched += len(ids)
+            self.env.cr.commit()
+        _logger.info(
+            "SUNLUX ESL: reconciliation matched %d goodsId(s) for %s",
+            matched, store.name or 'default store',
+        )
+        return matched
+
+    def _cron_sunlux_esl_reconcile(self):
+        """Backfill goodsIds, then queue every product that was missing one.
+
+        Matched products are queued for a price sync; the rest are truly
+        missing on the SUNLUX side and get a full sync. The goods list is
+        only downloaded from ``RECONCILE_MIN_MISSING`` missing products on,
+        unless the run was requested from Settings; fewer are simply queued
+        for a full sync. A store whose goods list cannot be read is skipped
+        until the next run.
+        """
+        queue = self.env['sunlux.esl.sync.queue']
+        ICP = self.env['ir.config_parameter'].sudo()
+        min_missing = 1 if ICP.get_param('sunlux_esl.reconcile_next_run') else RECONCILE_MIN_MISSING
+        ICP.set_param('sunlux_esl.reconcile_next_run', False)
+        for store in self._get_esl_stores():
+            missing_ids = self._get_esl_missing_goods_ids(store)
+            if not missing_ids:
+                continue
+            matched = 0
+            if len(missing_ids) >= min_missing:
+                try:
+                    matched = self._sunlux_esl_reconcile_goods(store)
+                except UserError as exc:
+                    _logger.warning(
+                        "SUNLUX ESL: reconciliation of %s skipped — %s",
+                        store.name or 'default store', exc,
+                    )
+                    continue
+            for start in range(0, len(missing_ids), CRON_PAGE_SIZE):
+                queue._enqueue(missing_ids[start:start + CRON_PAGE_SIZE])
+                self.env.cr.commit()
+            _logger.info(
+                "SUNLUX ESL: reconciliation queued %d product(s), %d for full sync",
+                len(missing_ids), len(missing_ids) - matched,
+            )
 
     # ------------------------------------------------------------------
     # Manual UI actions
@@ -218,26 +1049,26 @@ class ProductTemplate(models.Model):
                 },
             }
 
-        thread = threading.Thread(
-            target=self._sync_to_esl_background,
-            args=(self.ids,),
-            daemon=True,
-        )
-        thread.start()
+        # Forget the fingerprint so the push is not skipped as a no-op
+        self.write({'sunlux_price_hash': False})
+        self.env['sunlux.esl.sync.queue']._enqueue(self.ids, 'full', edited=True)
 
         return {
             'type': 'ir.actions.client',
             'tag': 'display_notification',
             'params': {
-                'title': _("ESL Sync Started"),
-                'message': _("Background sync started. Check logs for results."),
+                'title': _("ESL Sync Queued"),
+                'message': _("Product queued for ESL sync. Check logs for results."),
                 'type': 'info',
                 'sticky': False,
             },
         }
 
     def action_sunlux_bulk_sync(self):
-        """Server action from list view — sync selected products."""
+        """Server action from list view — queue the selected products for sync.
+
+        Products whose ESL data is unchanged since the last push are skipped.
+        """
         products = self.filtered('sunlux_esl_sync_enabled')
         if not products:
             return {
@@ -251,19 +1082,18 @@ class ProductTemplate(models.Model):
                 },
             }
 
-        thread = threading.Thread(
-            target=self._sync_to_esl_background,
-            args=(products.ids,),
-            daemon=True,
-        )
-        thread.start()
+        changed = products._filter_esl_changed()
+        self.env['sunlux.esl.sync.queue']._enqueue(changed.ids, edited=True)
 
         return {
             'type': 'ir.actions.client',
             'tag': 'display_notification',
             'params': {
                 'title': _("Bulk Sync Started"),
-                'message': _("%d product(s) queued for ESL sync.", len(products)),
+                'message': _(
+                    "%(queued)d product(s) queued for ESL sync, %(skipped)d unchanged.",
+                    queued=len(changed), skipped=len(products) - len(changed),
+                ),
                 'type': 'success',
                 'sticky': False,
             },
@@ -26,6 +26,155 @@ class ResConfigSettings(models.TransientModel):
         config_parameter='sunlux_esl.key',
     )
 
+    # Sync queue
+    sunlux_queue_batch_size = fields.Integer(
+        string='Queue Batch Size',
+        config_parameter='sunlux_esl.queue_batch_size', default=500,
+        help='Number of queued products synced per batch by the queue cron. '
+             'Once this many saves are waiting they are sent without waiting '
+             'for the debounce window.',
+    )
+    sunlux_queue_quiet_period = fields.Integer(
+        string='Debounce Window (seconds)',
+        config_parameter='sunlux_esl.queue_quiet_period', default=5,
+        help='Queued saves are sent once no product was saved for this long, '
+             'so a burst of edits (e.g. a price list update) goes out as one '
+             'batch. 0 sends every save right away. Without a dedicated worker, '
+             'the queue cron then starts on the next poll of the cron threads '
+             '(up to about a minute later).',
+    )
+    sunlux_queue_max_wait = fields.Integer(
+        string='Max Debounce Wait (seconds)',
+        config_parameter='sunlux_esl.queue_max_wait', default=60,
+        help='Longest a queued save waits for the saves after it to stop, '
+             'so a steady trickle of edits is still sent.',
+    )
+    sunlux_queue_dedicated_worker = fields.Boolean(
+        string='Dedicated Worker',
+        config_parameter='sunlux_esl.dedicated_worker',
+        help='The queue is drained by a separate "odoo-bin sunlux_esl_worker" '
+             'process instead of the scheduled actions, away from the web '
+             'and cron workers. Only tick this once the worker is running.',
+    )
+    sunlux_queue_max_attempts = fields.Integer(
+        string='Max Attempts',
+        config_parameter='sunlux_esl.queue_max_attempts', default=5,
+        help='Products SUNLUX rejects (or batches that fail) are tried this '
+             'many times before being moved to the dead-letter list',
+    )
+    sunlux_queue_retry_delay = fields.Integer(
+        string='Retry Delay (seconds)',
+        config_parameter='sunlux_esl.queue_retry_delay', default=60,
+        help='Wait before the first retry; doubled after every failed attempt',
+    )
+
+    # API performance
+    sunlux_sync_chunk_size = fields.Integer(
+        string='Items per Request',
+        config_parameter='sunlux_esl.sync_chunk_size', default=500,
+        help='Full and price syncs are split into requests of at most this many '
+             'products. Each request has its own timeout and log entry.',
+    )
+
+    sunlux_http_pool_size = fields.Integer(
+        string='Connection Pool Size',
+        config_parameter='sunlux_esl.http_pool_size', default=10,
+        help='Max keep-alive connections kept open to the SUNLUX host',
+    )
+    sunlux_http_max_retries = fields.Integer(
+        string='Max Retries',
+        config_parameter='sunlux_esl.http_max_retries', default=3,
+        help='Connection errors, timeouts and HTTP 429/5xx responses are retried '
+             'this many times. Each retry is logged as a warning.',
+    )
+    sunlux_http_retry_backoff = fields.Float(
+        string='Retry Backoff (s)',
+        config_parameter='sunlux_esl.http_retry_backoff', default=0.5,
+        help='Base delay between retries; doubled on every attempt, with random jitter',
+    )
+
+    sunlux_max_in_flight = fields.Integer(
+        string='Parallel Requests',
+        config_parameter='sunlux_esl.max_in_flight', default=4,
+        help='Max number of chunk requests sent to SUNLUX at the same time',
+    )
+    sunlux_rate_limit = fields.Float(
+        string='Requests per Second',
+        config_parameter='sunlux_esl.rate_limit', default=5.0,
+        help='Upper bound on requests sent to SUNLUX per second, retries '
+             'included. 0 disables the limit.',
+    )
+    sunlux_circuit_threshold = fields.Integer(
+        string='Circuit Breaker Threshold',
+        config_parameter='sunlux_esl.circuit_threshold', default=5,
+        help='After this many consecutive failed calls (timeouts, connection '
+             'errors, HTTP 429/5xx) SUNLUX is considered down and calls fail '
+             'immediately instead of waiting on it.',
+    )
+    sunlux_circuit_cooldown = fields.Integer(
+        string='Circuit Breaker Cooldown (s)',
+        config_parameter='sunlux_esl.circuit_cooldown', default=60,
+        help='Time before a single probe call is let through to check '
+             'whether SUNLUX is back. Queued syncs wait until then.',
+    )
+    sunlux_profile_next_run = fields.Boolean(
+        string='Profile Next Sync Run',
+        config_parameter='sunlux_esl.profile_next_run',
+        help='Run the profiler during the next sync run and store its report '
+             'on the run. Unticks itself once used.',
+    )
+
+    # API logging
+    sunlux_log_level = fields.Selection([
+        ('errors', 'Errors Only'),
+        ('metadata', 'Metadata Only'),
+        ('sampled', 'Sampled Bodies'),
+        ('full', 'Full Bodies'),
+    ], string='Log Verbosity',
+        config_parameter='sunlux_esl.log_level', default='metadata',
+        help='Errors Only: only failed and retried calls are logged.\n'
+             'Metadata Only: every call is logged without request/response bodies.\n'
+             'Sampled Bodies: bodies are kept for a percentage of calls.\n'
+             'Full Bodies: bodies are kept for every call.\n'
+             'Failed calls always keep their bodies.',
+    )
+    sunlux_log_sample_percent = fields.Integer(
+        string='Sampled Calls (%)',
+        config_parameter='sunlux_esl.log_sample_percent', default=10,
+    )
+    sunlux_log_max_size = fields.Integer(
+        string='Max Body Size',
+        config_parameter='sunlux_esl.log_max_size', default=100000,
+        help='Request/response bodies longer than this many characters are truncated',
+    )
+
+    sunlux_stock_window_minutes = fields.Integer(
+        string='Stock Window (minutes)',
+        config_parameter='sunlux_esl.stock_window_minutes', default=10,
+        help='Stock moves are collected for this long before the new levels '
+             'are pushed, so a busy product is sent once per window.',
+    )
+    sunlux_stock_min_change = fields.Integer(
+        string='Min. Stock Change',
+        config_parameter='sunlux_esl.stock_min_change', default=1,
+        help='Smaller stock changes are not pushed. Running out of stock '
+             'and coming back are always pushed.',
+    )
+    sunlux_promotion_lead_hours = fields.Integer(
+        string='Promotion Lead Time (hours)',
+        config_parameter='sunlux_esl.promotion_lead_hours', default=48,
+        help='Promotions starting within this many hours are pushed by the '
+             'off-peak run. Keep it above the interval of the '
+             '"Publish Promotions" scheduled action.',
+    )
+
+    sunlux_log_retention_days = fields.Integer(
+        string='Log Retention (days)',
+        config_parameter='sunlux_esl.log_retention_days', default=30,
+        help='Older log entries are summarized into daily stats and deleted. '
+             '0 keeps logs forever.',
+    )
+
     # Read-only status
     sunlux_token_preview = fields.Char(
         string='Cached Token', compute='_compute_sunlux_token_status',
@@ -34,6 +183,28 @@ class ResConfigSettings(models.TransientModel):
         string='Token Expires', compute='_compute_sunlux_token_status',
     )
 
+    sunlux_circuit_state = fields.Char(
+        string='Circuit Breaker', compute='_compute_sunlux_circuit_status',
+    )
+    sunlux_circuit_last_error = fields.Char(
+        string='Last Error', compute='_compute_sunlux_circuit_status',
+    )
+
+    def _compute_sunlux_circuit_status(self):
+        circuit = self.env['sunlux.esl.circuit'].sudo()._get_state(False)
+        states = dict(circuit._fields['state']._description_selection(self.env))
+        for rec in self:
+            if circuit and circuit.state != 'closed':
+                rec.sunlux_circuit_state = _(
+                    "%(state)s since %(date)s", state=states[circuit.state],
+                    date=fields.Datetime.to_string(circuit.opened_at),
+                )
+            else:
+                rec.sunlux_circuit_state = _(
+                    "Closed (%s failure(s))", circuit.failure_count if circuit else 0,
+                )
+            rec.sunlux_circuit_last_error = circuit.last_error or 'N/A'
+
     def _compute_sunlux_token_status(self):
         ICP = self.env['ir.config_parameter'].sudo()
         token = ICP.get_param('sunlux_esl.token', '')
@@ -44,6 +215,18 @@ class ResConfigSettings(models.TransientModel):
             )
             rec.sunlux_token_expires = expire_str or 'N/A'
 
+    def set_values(self):
+        api_client = self.env['sunlux.esl.api']
+        old_config = api_client._get_api_config()
+        super().set_values()
+        credentials_changed = api_client._get_api_config() != old_config
+        if credentials_changed:
+            # A token issued for the old credentials must not be reused
+            ICP = self.env['ir.config_parameter'].sudo()
+            ICP.set_param('sunlux_esl.token', '')
+            ICP.set_param('sunlux_esl.token_expire', '')
+        api_client._invalidate_cache(clear_token=credentials_changed)
+
     # -----------------------------------------------------------------
     # Action buttons
     # -----------------------------------------------------------------
@@ -74,11 +257,48 @@ class ResConfigSettings(models.TransientModel):
                 },
             }
 
+    def action_sunlux_reconcile_goods(self):
+        """Run the goodsId reconciliation job in the background, however few
+        goodsIds are missing."""
+        self.env['ir.config_parameter'].sudo().set_param('sunlux_esl.reconcile_next_run', True)
+        self.env.ref('sunlux_esl.ir_cron_sunlux_esl_reconcile').sudo()._trigger()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _("Reconciliation Started"),
+                'message': _("Missing goods IDs are being matched against the SUNLUX catalog."),
+                'type': 'info',
+                'sticky': False,
+            },
+        }
+
+    def action_sunlux_reset_circuit(self):
+        """Close the circuit breaker of the Settings credentials."""
+        self.env['sunlux.esl.circuit'].sudo()._get_state(False).action_reset()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _("Circuit Breaker Reset"),
+                'message': _("Calls to SUNLUX go through again."),
+                'type': 'info',
+                'sticky': False,
+                'next': {'type': 'ir.actions.client', 'tag': 'reload'},
+            },
+        }
+
     def action_sunlux_clear_token(self):
         """Wipe cached token so the next call fetches a new one."""
         ICP = self.env['ir.config_parameter'].sudo()
         ICP.set_param('sunlux_esl.token', '')
         ICP.set_param('sunlux_esl.token_expire', '')
+        # Drops the in-memory tokens of every worker
+        api_client = self.env['sunlux.esl.api']
+        ICP.set_param(
+            'sunlux_esl.token_generation', str(api_client._get_token_generation() + 1),
+        )
+        api_client._invalidate_cache()
         return {
             'type': 'ir.actions.client',
             'tag': 'display_notification',
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from odoo import api, models
+
+
+class StockQuant(models.Model):
+    _inherit = 'stock.quant'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        quants = super().create(vals_list)
+        quants._sunlux_esl_stock_changed()
+        return quants
+
+    def write(self, vals):
+        result = super().write(vals)
+        if 'quantity' in vals:
+            self._sunlux_esl_stock_changed()
+        return result
+
+    def _sunlux_esl_stock_changed(self):
+        """Flag the templates of quants counted in the ESL stock level."""
+        quants = self.filtered(lambda q: q.location_id.usage in ('internal', 'transit'))
+        if quants:
+            self.env['product.template']._mark_esl_stock_dirty(
+                quants.product_id.product_tmpl_id.ids,
+            )
@@ -2,13 +2,21 @@
 import hashlib
 import json
 import logging
+import random
+import threading
 import time
 
 import requests
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from requests.adapters import HTTPAdapter
 
 from odoo import api, models, _
 from odoo.exceptions import UserError
+from odoo.tools import ormcache
+
+from .sunlux_esl_circuit import SunluxEslCircuitOpen
 
 _logger = logging.getLogger(__name__)
 
@@ -16,6 +24,156 @@ _logger = logging.getLogger(__name__)
 AUTH_TIMEOUT = 15
 DATA_TIMEOUT = 30
 
+# Max items per POST for full/price syncs (overridable in Settings)
+DEFAULT_CHUNK_SIZE = 500
+
+# Goods fetched per page when listing the SUNLUX catalog
+GOODS_PAGE_SIZE = 1000
+
+# HTTP pooling / retry defaults (overridable in Settings)
+DEFAULT_POOL_SIZE = 10
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_RETRY_BACKOFF = 0.5     # seconds, doubled on every attempt
+MAX_RETRY_DELAY = 30            # seconds
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+# Parallel dispatch defaults (overridable in Settings)
+DEFAULT_MAX_IN_FLIGHT = 4
+DEFAULT_RATE_LIMIT = 5.0        # requests per second, 0 = unlimited
+
+# Process-wide keep-alive sessions, one per (base_url, pool size)
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+# In-process bearer token cache: token key -> (token, expire_dt), see
+# SunluxEslApi._get_token_key
+_token_cache = {}
+# Per-token-key locks so only one token refresh is in flight at a time
+_token_locks = {}
+_token_locks_guard = threading.Lock()
+
+# Process-wide rate limiters, one per (base_url, merchant uid, rate)
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+class _TokenBucket:
+    """Thread-safe token bucket: ``rate`` requests/second, bursts up to ``rate``."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.capacity = max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def _get_token_lock(token_key):
+    """Return the token refresh lock for ``token_key``."""
+    with _token_locks_guard:
+        return _token_locks.setdefault(token_key, threading.Lock())
+
+
+def _get_rate_limiter(base_url, rate, uid=''):
+    """Return the shared token bucket for a set of credentials, or None if unlimited."""
+    if not rate or rate <= 0:
+        return None
+    key = (base_url, uid, rate)
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get(key)
+        if limiter is None:
+            limiter = _rate_limiters[key] = _TokenBucket(rate)
+        return limiter
+
+
+def _get_session(base_url, pool_size=DEFAULT_POOL_SIZE):
+    """Return the shared pooled session for ``base_url``."""
+    key = (base_url, pool_size)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            # Retries are handled by _post_with_retry so they can be logged
+            adapter = HTTPAdapter(
+                pool_connections=1, pool_maxsize=pool_size, max_retries=0,
+            )
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _sessions[key] = session
+        return session
+
+
+def _retry_delay(attempt, backoff):
+    """Exponential backoff with full jitter for the given attempt (1-based)."""
+    return random.uniform(0, min(MAX_RETRY_DELAY, backoff * (2 ** (attempt - 1))))
+
+
+def _post_with_retry(session, endpoint, payload, headers=None, timeout=DATA_TIMEOUT,
+                     max_retries=DEFAULT_MAX_RETRIES, backoff=DEFAULT_RETRY_BACKOFF,
+                     limiter=None):
+    """POST ``payload``, retrying connection errors, timeouts and 429/5xx.
+
+    Does not touch the database, so it is safe to call from worker threads.
+    ``payload`` may be pre-serialized JSON ``bytes``.
+    Every SUNLUX endpoint used here is idempotent (upserts keyed by barcode
+    or goodsId, token requests), which makes retrying after a timeout safe.
+
+    :param limiter: optional ``_TokenBucket`` acquired before every attempt
+    :return: ``(response, error, failed_attempts)`` — ``error`` is the last
+             exception if every attempt raised, ``failed_attempts`` is a list
+             of dicts describing the attempts that were retried.
+    """
+    failed_attempts = []
+    attempt = 0
+    while True:
+        attempt += 1
+        if limiter:
+            limiter.acquire()
+        start = time.time()
+        try:
+            body = {'data': payload} if isinstance(payload, bytes) else {'json': payload}
+            resp = session.post(endpoint, headers=headers, timeout=timeout, **body)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as exc:
+            if attempt > max_retries:
+                return None, exc, failed_attempts
+            resp, reason, code = None, str(exc), None
+        except requests.exceptions.RequestException as exc:
+            return None, exc, failed_attempts
+        else:
+            if resp.status_code not in RETRY_STATUS_CODES or attempt > max_retries:
+                return resp, None, failed_attempts
+            reason, code = f"HTTP {resp.status_code}", resp.status_code
+
+        delay = _retry_delay(attempt, backoff)
+        failed_attempts.append({
+            'attempt': attempt,
+            'reason': reason,
+            'response_code': code,
+            'duration_ms': int((time.time() - start) * 1000),
+            'delay': delay,
+        })
+        time.sleep(delay)
+
+
+def _timed_post_with_retry(*args, **kwargs):
+    """``_post_with_retry`` plus the total wall-clock duration in ms."""
+    start = time.time()
+    resp, error, failed_attempts = _post_with_retry(*args, **kwargs)
+    return resp, error, failed_attempts, int((time.time() - start) * 1000)
+
 
 class SunluxEslApi(models.AbstractModel):
     """API client for SUNLUX ESL REST API v1.4."""
@@ -27,16 +185,120 @@ class SunluxEslApi(models.AbstractModel):
     # Configuration helpers
     # -------------------------------------------------------------------------
 
+    def _for_store(self, store):
+        """Return this client bound to ``store`` (a ``sunlux.esl.store``).
+
+        An empty ``store`` means the credentials from Settings.
+        """
+        return self.with_context(sunlux_esl_store_id=store.id or False)
+
+    def _get_store_id(self):
+        """Id of the store this client is bound to, 0 for Settings."""
+        return self.env.context.get('sunlux_esl_store_id') or 0
+
+    def _get_token_key(self):
+        """Key of the bound store's token in the in-process cache.
+
+        Besides the database and store (0 for Settings), it holds the
+        credentials and the token generation, both read through the registry
+        cache, which every worker clears when they change: a token issued
+        for older credentials, or cleared from Settings, is dropped by all
+        workers, not just the one that handled the change.
+        """
+        store_id = self._get_store_id()
+        return (
+            self.env.cr.dbname, store_id, self._get_token_generation(),
+            *self._get_api_config_cached(store_id),
+        )
+
+    @ormcache()
+    def _get_token_generation(self):
+        """Counter bumped by "Clear Token" in Settings."""
+        return self._get_int_param('sunlux_esl.token_generation', 0)
+
     def _get_api_config(self):
-        """Retrieve API credentials from ir.config_parameter."""
+        """Retrieve API credentials of the bound store (cached)."""
+        base_url, uid, sid, key = self._get_api_config_cached(self._get_store_id())
+        return {'base_url': base_url, 'uid': uid, 'sid': sid, 'key': key}
+
+    @ormcache('store_id')
+    def _get_api_config_cached(self, store_id):
+        """Credentials as an immutable tuple, cached per database and store.
+
+        The registry cache is cleared (in every worker) whenever an
+        ir.config_parameter or a store's credentials are written, so edits
+        apply at once.
+        """
+        if store_id:
+            store = self.env['sunlux.esl.store'].sudo().browse(store_id).exists()
+            return (
+                (store.base_url or '').rstrip('/'),
+                store.uid or '', store.sid or '', store.key or '',
+            )
         ICP = self.env['ir.config_parameter'].sudo()
+        return (
+            (ICP.get_param('sunlux_esl.base_url', '') or '').rstrip('/'),
+            ICP.get_param('sunlux_esl.uid', ''),
+            ICP.get_param('sunlux_esl.sid', ''),
+            ICP.get_param('sunlux_esl.key', ''),
+        )
+
+    def _invalidate_cache(self, clear_token=True):
+        """Drop cached credentials and, optionally, the bound store's cached token."""
+        self.env.registry.clear_cache()
+        if clear_token:
+            _token_cache.pop(self._get_token_key(), None)
+
+    def _get_int_param(self, key, default, minimum=0):
+        """Read an integer ir.config_parameter, falling back to ``default``."""
+        ICP = self.env['ir.config_parameter'].sudo()
+        try:
+            value = int(ICP.get_param(key, default))
+        except (TypeError, ValueError):
+            value = default
+        return max(value, minimum)
+
+    def _get_chunk_size(self):
+        """Max number of items sent in a single data POST."""
+        return self._get_int_param('sunlux_esl.sync_chunk_size', DEFAULT_CHUNK_SIZE, minimum=1)
+
+    def _get_float_param(self, key, default, minimum=0.0):
+        """Read a float ir.config_parameter, falling back to ``default``."""
+        ICP = self.env['ir.config_parameter'].sudo()
+        try:
+            value = float(ICP.get_param(key, default))
+        except (TypeError, ValueError):
+            value = default
+        return max(value, minimum)
+
+    def _get_http_options(self):
+        """Pooling, retry, concurrency and rate-limit settings for HTTP calls."""
         return {
-            'base_url': (ICP.get_param('sunlux_esl.base_url', '') or '').rstrip('/'),
-            'uid': ICP.get_param('sunlux_esl.uid', ''),
-            'sid': ICP.get_param('sunlux_esl.sid', ''),
-            'key': ICP.get_param('sunlux_esl.key', ''),
+            'pool_size': self._get_int_param('sunlux_esl.http_pool_size', DEFAULT_POOL_SIZE, minimum=1),
+            'max_retries': self._get_int_param('sunlux_esl.http_max_retries', DEFAULT_MAX_RETRIES),
+            'backoff': self._get_float_param('sunlux_esl.http_retry_backoff', DEFAULT_RETRY_BACKOFF),
+            'max_in_flight': self._get_int_param('sunlux_esl.max_in_flight', DEFAULT_MAX_IN_FLIGHT, minimum=1),
+            'rate_limit': self._get_float_param('sunlux_esl.rate_limit', DEFAULT_RATE_LIMIT),
         }
 
+    def _http_post(self, operation, base_url, endpoint, payload, headers=None,
+                   timeout=DATA_TIMEOUT):
+        """POST through the pooled session, logging every retried attempt.
+
+        Raises the last ``requests`` exception if no attempt got a response.
+        """
+        options = self._get_http_options()
+        session = _get_session(base_url, options['pool_size'])
+        resp, error, failed_attempts = _post_with_retry(
+            session, endpoint, payload, headers=headers, timeout=timeout,
+            max_retries=options['max_retries'], backoff=options['backoff'],
+            limiter=_get_rate_limiter(base_url, options['rate_limit'], self._get_api_config()['uid']),
+        )
+        self._log_retries(operation, endpoint, failed_attempts, options['max_retries'])
+        if error:
+            raise error
+        return resp
+
     # -------------------------------------------------------------------------
     # Authentication
     # -------------------------------------------------------------------------
@@ -47,35 +309,94 @@ class SunluxEslApi(models.AbstractModel):
         raw = f"sid={sid}&key={key}&uid={uid}&timestamp={timestamp}"
         return hashlib.md5(raw.encode('utf-8')).hexdigest()
 
+    @staticmethod
+    def _is_token_valid(expire_dt):
+        """A token is reused until 5 minutes before it expires."""
+        return datetime.now() < expire_dt - timedelta(minutes=5)
+
     def _get_cached_token(self):
-        """Return cached (token, expire_dt) or (None, None) if expired."""
-        ICP = self.env['ir.config_parameter'].sudo()
-        token = ICP.get_param('sunlux_esl.token', '')
-        expire_str = ICP.get_param('sunlux_esl.token_expire', '')
+        """Return cached (token, expire_dt) or (None, None) if expired.
+
+        The in-process cache is checked first; on a miss the token persisted
+        in the database (possibly fetched by another worker) is loaded into
+        it.
+        """
+        token_key = self._get_token_key()
+        token, expire_dt = _token_cache.get(token_key, (None, None))
+        if token and self._is_token_valid(expire_dt):
+            return token, expire_dt
+
+        token, expire_str = self._read_persisted_token()
         if not token or not expire_str:
             return None, None
         try:
             expire_dt = datetime.fromisoformat(expire_str)
-            if datetime.now() >= expire_dt - timedelta(minutes=5):
-                return None, None
-            return token, expire_dt
         except (ValueError, TypeError):
             return None, None
+        if not self._is_token_valid(expire_dt):
+            return None, None
+        _token_cache[token_key] = (token, expire_dt)
+        return token, expire_dt
+
+    def _read_persisted_token(self):
+        """Return the (token, expiry string) stored for the bound store."""
+        store_id = self._get_store_id()
+        if store_id:
+            store = self.env['sunlux.esl.store'].sudo().browse(store_id)
+            return store.token, store.token_expire
+        ICP = self.env['ir.config_parameter'].sudo()
+        return ICP.get_param('sunlux_esl.token', ''), ICP.get_param('sunlux_esl.token_expire', '')
+
+    def _persist_token(self, token, expire_str):
+        """Store the token of the bound store in the database.
+
+        Written on a separate, immediately committed cursor so a long sync
+        transaction never holds a lock on it.
+        """
+        store_id = self._get_store_id()
+        with self.pool.cursor() as cr:
+            env = self.env(cr=cr)
+            if store_id:
+                env['sunlux.esl.store'].sudo().browse(store_id).write({
+                    'token': token, 'token_expire': expire_str,
+                })
+            else:
+                ICP = env['ir.config_parameter'].sudo()
+                ICP.set_param('sunlux_esl.token', token)
+                ICP.set_param('sunlux_esl.token_expire', expire_str)
 
     def _cache_token(self, token, expire_minutes=1440):
-        """Store token + expiry in ir.config_parameter."""
-        ICP = self.env['ir.config_parameter'].sudo()
+        """Store token + expiry in memory and in the database."""
         expire_dt = datetime.now() + timedelta(minutes=expire_minutes)
-        ICP.set_param('sunlux_esl.token', token)
-        ICP.set_param('sunlux_esl.token_expire', expire_dt.isoformat())
+        _token_cache[self._get_token_key()] = (token, expire_dt)
+        self._persist_token(token, expire_dt.isoformat())
+
+    def _drop_token(self):
+        """Forget a token SUNLUX rejected, in memory and in the database."""
+        _token_cache.pop(self._get_token_key(), None)
+        self._persist_token('', '')
 
     def _get_token(self, force_refresh=False):
-        """Get a valid Bearer token (from cache or fresh request)."""
+        """Get a valid Bearer token (from cache or fresh request).
+
+        Refreshes are single-flight per database and store: concurrent
+        callers wait for the one in progress and reuse its token.
+        """
         if not force_refresh:
-            cached, _ = self._get_cached_token()
+            cached = self._get_cached_token()[0]
             if cached:
                 return cached
 
+        with _get_token_lock(self._get_token_key()):
+            if not force_refresh:
+                # Another thread may have refreshed it while we waited
+                cached = self._get_cached_token()[0]
+                if cached:
+                    return cached
+            return self._request_token()
+
+    def _request_token(self):
+        """Fetch a new Bearer token from SUNLUX and cache it."""
         config = self._get_api_config()
         if not all([config['base_url'], config['uid'], config['sid'], config['key']]):
             raise UserError(_(
@@ -98,7 +419,14 @@ class SunluxEslApi(models.AbstractModel):
 
         start = time.time()
         try:
-            resp = requests.post(endpoint, json=payload, timeout=AUTH_TIMEOUT)
+            try:
+                resp = self._http_post(
+                    'get_token', config['base_url'], endpoint, payload, timeout=AUTH_TIMEOUT,
+                )
+            except requests.exceptions.RequestException as exc:
+                self._circuit_record(str(exc))
+                raise
+            self._circuit_record_response(resp)
             duration_ms = int((time.time() - start) * 1000)
             resp.raise_for_status()
             result = resp.json()
@@ -138,7 +466,7 @@ class SunluxEslApi(models.AbstractModel):
 
     def sync_products_full(self, products_data, product_ids=None, product_names=None):
         """POST /goods/goods/batch/edit?light=0 — full product sync."""
-        return self._post_data(
+        return self._post_chunked(
             operation='sync_product',
             path='/epts-api/goods/goods/batch/edit?light=0',
             payload=products_data,
@@ -148,7 +476,7 @@ class SunluxEslApi(models.AbstractModel):
 
     def sync_prices(self, price_data, product_ids=None, product_names=None):
         """POST /goods/goods/batchPrice — price-only sync."""
-        return self._post_data(
+        return self._post_chunked(
             operation='sync_price',
             path='/epts-api/goods/goods/batchPrice',
             payload=price_data,
@@ -156,27 +484,226 @@ class SunluxEslApi(models.AbstractModel):
             product_names=product_names,
         )
 
+    def iter_sync_products_full(self, chunks):
+        """Streaming ``sync_products_full``.
+
+        ``chunks`` is a lazy iterable of ``(payload, product_ids,
+        product_names)``; yields ``(chunk, data)`` per chunk, in order, so
+        callers can build the next chunks while earlier ones are in flight
+        and drop each one once its result is handled.
+        """
+        return self._dispatch_chunks(
+            'sync_product', '/epts-api/goods/goods/batch/edit?light=0', chunks,
+        )
+
+    def iter_sync_prices(self, chunks):
+        """Streaming ``sync_prices``; see ``iter_sync_products_full``."""
+        return self._dispatch_chunks('sync_price', '/epts-api/goods/goods/batchPrice', chunks)
+
+    def iter_sync_products_light(self, chunks):
+        """POST /goods/goods/batch/edit?light=1 — light edit of the given
+        fields of existing goods (by ``goodsId``); streaming, see
+        ``iter_sync_products_full``."""
+        return self._dispatch_chunks(
+            'sync_light', '/epts-api/goods/goods/batch/edit?light=1', chunks,
+        )
+
+    def sync_stock(self, stock_data, product_ids=None, product_names=None):
+        """POST /goods/goods/batch/edit?light=1 — light edit of stock levels."""
+        return self._post_chunked(
+            operation='sync_stock',
+            path='/epts-api/goods/goods/batch/edit?light=1',
+            payload=stock_data,
+            product_ids=product_ids,
+            product_names=product_names,
+        )
+
+    def list_goods(self, page_num, page_size=GOODS_PAGE_SIZE):
+        """POST /goods/goods/list — one page of the SUNLUX goods catalog.
+
+        Returns the response ``data`` (``{'rows': [...], 'total': n}``).
+        Raises ``UserError`` if the page could not be fetched, so callers
+        never mistake a failed page for the end of the catalog.
+        """
+        data = self._post_data(
+            operation='list_goods',
+            path='/epts-api/goods/goods/list',
+            payload={'pageNum': page_num, 'pageSize': page_size},
+        )
+        if not isinstance(data, dict) or not isinstance(data.get('rows'), list):
+            raise UserError(_("SUNLUX ESL: could not list goods (page %s).", page_num))
+        return data
+
+    def iter_goods(self, page_size=GOODS_PAGE_SIZE):
+        """Yield the whole SUNLUX goods catalog, one page of rows at a time."""
+        page_num = 1
+        while True:
+            rows = self.list_goods(page_num, page_size)['rows']
+            if rows:
+                yield rows
+            if len(rows) < page_size:
+                return
+            page_num += 1
+
     # -------------------------------------------------------------------------
     # Internal helpers
     # -------------------------------------------------------------------------
 
+    def _post_chunked(self, operation, path, payload, product_ids=None, product_names=None):
+        """Send ``payload`` in chunks and merge the per-chunk results.
+
+        ``product_ids`` / ``product_names`` are aligned with ``payload`` and
+        sliced along with it. Each chunk is a separate POST with its own
+        timeout and log row, so a failing chunk does not sink the others.
+        """
+        size = self._get_chunk_size()
+        chunks = (
+            (
+                payload[start:start + size],
+                product_ids[start:start + size] if product_ids else None,
+                product_names[start:start + size] if product_names else None,
+            )
+            for start in range(0, len(payload), size)
+        )
+        merged = {'suc': [], 'msg': []}
+        for _chunk, data in self._dispatch_chunks(operation, path, chunks):
+            self._merge_result(merged, data)
+        return merged
+
+    @staticmethod
+    def _merge_result(merged, data):
+        """Fold one chunk's ``data`` ({'suc': [...], 'msg': ...}) into ``merged``."""
+        if not isinstance(data, dict):
+            return
+        merged['suc'].extend(data.get('suc') or [])
+        msg = data.get('msg')
+        if isinstance(msg, list):
+            merged['msg'].extend(msg)
+        elif msg:
+            merged['msg'].append(msg)
+
+    def _dispatch_chunks(self, operation, path, chunks):
+        """POST ``(payload, product_ids, product_names)`` chunks concurrently.
+
+        HTTP calls run on a bounded thread pool — at most ``max_in_flight``
+        at once, throttled by the shared requests-per-second bucket. The
+        worker threads never touch the database: logging happens here, on
+        the calling cursor, and ``(chunk, data)`` is yielded in input order
+        so the caller does its write-back on its own cursor too.
+        ``chunks`` may be a lazy iterable; only ``max_in_flight`` chunks are
+        held at a time.
+
+        The circuit breaker is checked before every chunk, so chunks stop
+        going out as soon as it opens. A chunk sent as the probe of a
+        half-open circuit goes alone and without retries; the next one waits
+        for its outcome.
+        """
+        probe = self._circuit_check()
+        run_model = self.env['sunlux.esl.sync.run']
+        config = self._get_api_config()
+        with run_model._phase('token'):
+            token = self._get_token()
+        endpoint = f"{config['base_url']}{path}"
+        headers = {
+            'Authorization': f'Bearer {token}',
+            'Content-Type': 'application/json',
+        }
+        options = self._get_http_options()
+        session = _get_session(config['base_url'], options['pool_size'])
+        limiter = _get_rate_limiter(config['base_url'], options['rate_limit'], config['uid'])
+
+        def send(body, max_retries):
+            return _timed_post_with_retry(
+                session, endpoint, body, headers=headers, timeout=DATA_TIMEOUT,
+                max_retries=max_retries, backoff=options['backoff'],
+                limiter=limiter,
+            )
+
+        def collect(chunk, future, max_retries):
+            (payload, ids, names) = chunk
+            with run_model._phase('http'):
+                result = future.result()
+            data = self._handle_response(
+                operation, endpoint, payload, *result,
+                max_retries=max_retries,
+                product_ids=ids, product_names=names,
+            )
+            return chunk, data if isinstance(data, dict) else {}
+
+        max_in_flight = options['max_in_flight']
+        with ThreadPoolExecutor(max_workers=max_in_flight,
+                                thread_name_prefix='sunlux_esl') as executor:
+            in_flight = deque()
+            checked = True
+            for chunk in chunks:
+                if not checked:
+                    try:
+                        probe = self._circuit_check()
+                    except SunluxEslCircuitOpen:
+                        # Hand back what is already on its way, then stop
+                        while in_flight:
+                            yield collect(*in_flight.popleft())
+                        raise
+                checked = False
+                # Serialized here so the timing is attributed to this phase
+                with run_model._phase('serialize'):
+                    body = json.dumps(chunk[0], separators=(',', ':')).encode('utf-8')
+                max_retries = 0 if probe else options['max_retries']
+                in_flight.append((chunk, executor.submit(send, body, max_retries), max_retries))
+                if probe:
+                    while in_flight:
+                        yield collect(*in_flight.popleft())
+                elif len(in_flight) >= max_in_flight:
+                    yield collect(*in_flight.popleft())
+            while in_flight:
+                yield collect(*in_flight.popleft())
+
     def _post_data(self, operation, path, payload, product_ids=None, product_names=None):
         """Generic authenticated POST with logging."""
+        probe = self._circuit_check()
+        run_model = self.env['sunlux.esl.sync.run']
         config = self._get_api_config()
-        token = self._get_token()
+        with run_model._phase('token'):
+            token = self._get_token()
         endpoint = f"{config['base_url']}{path}"
         headers = {'Authorization': f'Bearer {token}'}
+        options = self._get_http_options()
+        # A probe is a single request
+        max_retries = 0 if probe else options['max_retries']
+
+        with run_model._phase('http'):
+            result = _timed_post_with_retry(
+                _get_session(config['base_url'], options['pool_size']),
+                endpoint, payload, headers=headers, timeout=DATA_TIMEOUT,
+                max_retries=max_retries, backoff=options['backoff'],
+                limiter=_get_rate_limiter(config['base_url'], options['rate_limit'], config['uid']),
+            )
+        return self._handle_response(
+            operation, endpoint, payload, *result,
+            max_retries=max_retries,
+            product_ids=product_ids, product_names=product_names,
+        )
+
+    def _handle_response(self, operation, endpoint, payload, resp, error,
+                         failed_attempts, duration_ms, max_retries,
+                         product_ids=None, product_names=None):
+        """Log a finished data POST and return its ``data`` dict."""
+        self._log_retries(operation, endpoint, failed_attempts, max_retries)
+        if error:
+            self._circuit_record(str(error))
+        else:
+            self._circuit_record_response(resp)
 
         # Build product info string for logging
         log_product_id = product_ids[0] if product_ids and len(product_ids) == 1 else None
         log_product_name = ', '.join(product_names) if product_names else ''
 
-        start = time.time()
         try:
-            resp = requests.post(
-                endpoint, json=payload, headers=headers, timeout=DATA_TIMEOUT,
-            )
-            duration_ms = int((time.time() - start) * 1000)
+            if error:
+                raise error
+            if resp.status_code == 401:
+                # Token revoked or replaced by another worker's refresh
+                self._drop_token()
             resp.raise_for_status()
             result = resp.json()
 
@@ -202,6 +729,50 @@ class SunluxEslApi(models.AbstractModel):
             self._log_error(operation, endpoint, payload, str(exc))
             return {'suc': [], 'msg': [str(exc)]}
 
+    # -------------------------------------------------------------------------
+    # Circuit breaker (see sunlux.esl.circuit)
+    # -------------------------------------------------------------------------
+
+    def _circuit_check(self):
+        """Raise ``SunluxEslCircuitOpen`` if the bound store's circuit is open.
+
+        :return: True if the next request is the probe of a half-open circuit
+        """
+        return self.env['sunlux.esl.circuit'].sudo()._before_call(self._get_store_id())
+
+    def _circuit_record(self, error=None):
+        """Report the outcome of a call: a failure if ``error`` is set."""
+        circuit = self.env['sunlux.esl.circuit'].sudo()
+        if error:
+            circuit._record_failure(self._get_store_id(), error)
+        else:
+            circuit._record_success(self._get_store_id())
+
+    def _circuit_record_response(self, resp):
+        """Throttling and server errors count as failures, other answers do not."""
+        if resp.status_code in RETRY_STATUS_CODES:
+            self._circuit_record(f'HTTP {resp.status_code}')
+        else:
+            self._circuit_record()
+
+    def _log_retries(self, operation, endpoint, failed_attempts, max_retries):
+        """Write one warning row per retried attempt."""
+        for attempt in failed_attempts:
+            message = "Attempt %d/%d failed (%s), retrying in %.1fs" % (
+                attempt['attempt'], max_retries + 1, attempt['reason'], attempt['delay'],
+            )
+            _logger.warning("SUNLUX ESL %s: %s", operation, message)
+            self.env['sunlux.esl.log'].log_api_call(
+                operation=operation,
+                endpoint=endpoint,
+                request_data=None,
+                response_code=attempt['response_code'],
+                response_data=None,
+                error_message=message,
+                duration_ms=attempt['duration_ms'],
+                status='warning',
+            )
+
     def _log_error(self, operation, endpoint, payload, message):
         """Shortcut to log a failed API call."""
         _logger.error("SUNLUX ESL %s error: %s", operation, message)
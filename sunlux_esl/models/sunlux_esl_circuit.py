@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+from datetime import timedelta
+
+from odoo import _, api, fields, models
+from odoo.exceptions import UserError
+from odoo.tools import SQL
+
+_logger = logging.getLogger(__name__)
+
+# Defaults, overridable through ir.config_parameter
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_COOLDOWN = 60               # seconds before a probe is let through
+
+# Last state seen by this process: (dbname, store id) -> (state, failure_count).
+# Lets successful calls skip the database while the circuit is healthy.
+_last_seen = {}
+_last_seen_lock = threading.Lock()
+
+
+class SunluxEslCircuitOpen(UserError):
+    """Raised instead of calling SUNLUX while its circuit breaker is open.
+
+    ``retry_at`` is when a probe will be let through; callers defer their
+    work until then instead of dropping it.
+    """
+
+    def __init__(self, message, retry_at):
+        super().__init__(message)
+        self.retry_at = retry_at
+
+
+class SunluxEslCircuit(models.Model):
+    """Circuit breaker state of one set of SUNLUX credentials.
+
+    closed → open after ``failure_threshold`` consecutive failures (timeouts,
+    connection errors, HTTP 429/5xx). While open, calls fail immediately.
+    After the cooldown one caller — across all workers — is let through as
+    a probe (half open): success closes the circuit, failure opens it again.
+
+    The state is read and written on separate, immediately committed
+    cursors, so it is shared by every worker at once and survives the
+    rollback of the sync that hit the failure.
+    """
+
+    _name = 'sunlux.esl.circuit'
+    _description = 'SUNLUX ESL Circuit Breaker'
+    _rec_name = 'store_id'
+
+    store_id = fields.Many2one(
+        'sunlux.esl.store', string='Store', ondelete='cascade', readonly=True,
+        help='Empty for the credentials from Settings',
+    )
+    state = fields.Selection([
+        ('closed', 'Closed'),
+        ('open', 'Open'),
+        ('half_open', 'Half Open'),
+    ], string='Status', required=True, default='closed', readonly=True)
+    failure_count = fields.Integer(string='Consecutive Failures', readonly=True)
+    opened_at = fields.Datetime(string='Opened On', readonly=True)
+    last_error = fields.Char(string='Last Error', readonly=True)
+
+    _store_uniq = models.UniqueIndex("((COALESCE(store_id, 0)))")
+
+    # -------------------------------------------------------------------------
+    # Helpers
+    # -------------------------------------------------------------------------
+
+    @api.model
+    def _get_options(self):
+        api_client = self.env['sunlux.esl.api']
+        return (
+            api_client._get_int_param('sunlux_esl.circuit_threshold', DEFAULT_FAILURE_THRESHOLD, minimum=1),
+            api_client._get_int_param('sunlux_esl.circuit_cooldown', DEFAULT_COOLDOWN, minimum=1),
+        )
+
+    @api.model
+    def _store_condition(self, store_id):
+        return SQL("COALESCE(store_id, 0) = %s", store_id or 0)
+
+    @api.model
+    def _get_state(self, store_id):
+        """Return the circuit of ``store_id`` (0 for Settings) in the current
+        transaction's view, or an empty recordset if it never failed."""
+        return self.search([('store_id', '=', store_id or False)], limit=1)
+
+    # -------------------------------------------------------------------------
+    # Breaker
+    # -------------------------------------------------------------------------
+
+    @api.model
+    def _before_call(self, store_id):
+        """Let a call through, or raise ``SunluxEslCircuitOpen``.
+
+        :return: True if the caller holds the probe of a half-open circuit:
+                 it must then make a single request and report its outcome
+                 before making any other
+        """
+        key = (self.env.cr.dbname, store_id or 0)
+        with self.pool.cursor() as cr:
+            cr.execute(SQL(
+                "SELECT state, failure_count, opened_at FROM sunlux_esl_circuit WHERE %s",
+                self._store_condition(store_id),
+            ))
+            row = cr.fetchone()
+            if not row or row[0] == 'closed':
+                with _last_seen_lock:
+                    _last_seen[key] = ('closed', row[1] if row else 0)
+                return False
+            with _last_seen_lock:
+                _last_seen[key] = (row[0], row[1])
+
+            _threshold, cooldown = self._get_options()
+            now = fields.Datetime.now()
+            retry_at = row[2] + timedelta(seconds=cooldown)
+            if now >= retry_at:
+                # Claim the probe; a probe that never reported back expires
+                # after another cooldown
+                cr.execute(SQL(
+                    """
+                    UPDATE sunlux_esl_circuit SET state = 'half_open', opened_at = %(now)s
+                     WHERE %(store)s AND state != 'closed' AND opened_at <= %(limit)s
+                    RETURNING id
+                    """,
+                    now=now, limit=now - timedelta(seconds=cooldown),
+                    store=self._store_condition(store_id),
+                ))
+                if cr.fetchone():
+                    _logger.info("SUNLUX ESL: circuit half open, probing")
+                    return True
+                retry_at = now + timedelta(seconds=cooldown)
+        raise SunluxEslCircuitOpen(
+            _("SUNLUX ESL is unreachable (circuit breaker open); calls resume after %s.",
+              fields.Datetime.to_string(retry_at)),
+            retry_at,
+        )
+
+    @api.model
+    def _record_success(self, store_id):
+        """Close the circuit if this process saw it anything but healthy."""
+        key = (self.env.cr.dbname, store_id or 0)
+        with _last_seen_lock:
+            if _last_seen.get(key, ('closed', 0)) == ('closed', 0):
+                return
+            _last_seen[key] = ('closed', 0)
+        with self.pool.cursor() as cr:
+            cr.execute(SQL(
+                """
+                UPDATE sunlux_esl_circuit
+                   SET state = 'closed', failure_count = 0, opened_at = NULL
+                 WHERE %s AND (state != 'closed' OR failure_count > 0)
+                RETURNING id
+                """,
+                self._store_condition(store_id),
+            ))
+            if cr.fetchone():
+                _logger.info("SUNLUX ESL: circuit closed")
+
+    @api.model
+    def _record_failure(self, store_id, error):
+        """Count a failure; open the circuit at the threshold or on a failed probe."""
+        threshold, _cooldown = self._get_options()
+        now = fields.Datetime.now()
+        with self.pool.cursor() as cr:
+            cr.execute(SQL(
+                """
+                INSERT INTO sunlux_esl_circuit AS c
+                       (store_id, state, failure_count, opened_at, last_error,
+                        create_uid, create_date, write_uid, write_date)
+                VALUES (%(store_id)s, CASE WHEN %(threshold)s <= 1 THEN 'open' ELSE 'closed' END,
+                        1, CASE WHEN %(threshold)s <= 1 THEN %(now)s END, %(error)s,
+                        %(uid)s, %(now)s, %(uid)s, %(now)s)
+                ON CONFLICT ((COALESCE(store_id, 0))) DO UPDATE SET
+                       failure_count = c.failure_count + 1,
+                       last_error = EXCLUDED.last_error,
+                       state = CASE WHEN c.state != 'closed' OR c.failure_count + 1 >= %(threshold)s
+                                    THEN 'open' ELSE 'closed' END,
+                       opened_at = CASE WHEN c.state = 'half_open'
+                                          OR (c.state = 'closed' AND c.failure_count + 1 >= %(threshold)s)
+                                        THEN %(now)s ELSE c.opened_at END,
+                       write_uid = EXCLUDED.write_uid,
+                       write_date = EXCLUDED.write_date
+                RETURNING state, failure_count
+                """,
+                store_id=store_id or None, threshold=threshold, now=now,
+                error=(error or '')[:500], uid=self.env.uid,
+            ))
+            state, failure_count = cr.fetchone()
+        with _last_seen_lock:
+            _last_seen[(self.env.cr.dbname, store_id or 0)] = (state, failure_count)
+        if state == 'open':
+            _logger.warning(
+                "SUNLUX ESL: circuit open after %d consecutive failure(s): %s",
+                failure_count, error,
+            )
+
+    def action_reset(self):
+        """Close the circuit by hand (e.g. after fixing the network)."""
+        self.sudo().write({'state': 'closed', 'failure_count': 0, 'opened_at': False})
+        with _last_seen_lock:
+            for circuit in self:
+                _last_seen.pop((self.env.cr.dbname, circuit.store_id.id or 0), None)
@@ -1,11 +1,60 @@
 # -*- coding: utf-8 -*-
 import json
 import logging
+import random
+import threading
+from contextlib import contextmanager
+
+from datetime import timedelta
 
 from odoo import api, fields, models
+from odoo.tools import SQL
 
 _logger = logging.getLogger(__name__)
 
+OPERATION_SELECTION = [
+    ('get_token', 'Get Token'),
+    ('refresh_token', 'Refresh Token'),
+    ('sync_product', 'Sync Product'),
+    ('sync_price', 'Sync Price'),
+    ('sync_light', 'Light Edit'),
+    ('sync_stock', 'Sync Stock'),
+    ('delete_product', 'Delete Product'),
+    ('list_goods', 'List Goods'),
+    ('bulk_sync', 'Bulk Sync'),
+]
+
+STATUS_SELECTION = [
+    ('success', 'Success'),
+    ('warning', 'Warning'),
+    ('error', 'Error'),
+]
+
+# Defaults, overridable through ir.config_parameter
+DEFAULT_LOG_LEVEL = 'metadata'
+DEFAULT_SAMPLE_PERCENT = 10
+DEFAULT_MAX_SIZE = 100000       # characters per request/response body
+DEFAULT_RETENTION_DAYS = 30
+VACUUM_BATCH_SIZE = 5000
+PRODUCT_NAME_MAX_SIZE = 1000
+
+# Active log buffers of the current thread, keyed by cursor
+_buffers = threading.local()
+
+
+def _serialize(data):
+    """Compact JSON for log bodies (strings are kept as-is)."""
+    if isinstance(data, (dict, list)):
+        return json.dumps(data, separators=(',', ':'), ensure_ascii=False, default=str)
+    return data
+
+
+def _truncate(text, max_size):
+    """Cap ``text`` at ``max_size`` characters, noting how much was cut."""
+    if not text or not max_size or len(text) <= max_size:
+        return text
+    return "%s... [truncated %d chars]" % (text[:max_size], len(text) - max_size)
+
 
 class SunluxEslLog(models.Model):
     _name = 'sunlux.esl.log'
@@ -13,14 +62,9 @@ class SunluxEslLog(models.Model):
     _order = 'create_date desc'
     _rec_name = 'operation'
 
-    operation = fields.Selection([
-        ('get_token', 'Get Token'),
-        ('refresh_token', 'Refresh Token'),
-        ('sync_product', 'Sync Product'),
-        ('sync_price', 'Sync Price'),
-        ('delete_product', 'Delete Product'),
-        ('bulk_sync', 'Bulk Sync'),
-    ], string='Operation', required=True, index=True)
+    operation = fields.Selection(
+        OPERATION_SELECTION, string='Operation', required=True, index=True,
+    )
 
     product_id = fields.Many2one(
         'product.template', string='Product', ondelete='set null',
@@ -32,26 +76,109 @@ class SunluxEslLog(models.Model):
     response_code = fields.Integer(string='HTTP Status Code')
     response_data = fields.Text(string='Response Data')
 
-    status = fields.Selection([
-        ('success', 'Success'),
-        ('warning', 'Warning'),
-        ('error', 'Error'),
-    ], string='Status', required=True, default='success', index=True)
+    status = fields.Selection(
+        STATUS_SELECTION, string='Status', required=True, default='success', index=True,
+    )
 
     error_message = fields.Text(string='Error Message')
     duration_ms = fields.Integer(string='Duration (ms)')
+    item_count = fields.Integer(string='Items', help='Number of items in the request payload')
+    run_id = fields.Many2one(
+        'sunlux.esl.sync.run', string='Sync Run', ondelete='set null', index='btree_not_null',
+    )
+
+    # Backs the default order and the retention vacuum
+    _create_date_idx = models.Index('(create_date)')
+
+    # -------------------------------------------------------------------------
+    # Buffering
+    # -------------------------------------------------------------------------
+
+    def _get_buffer(self):
+        """Return the active buffer (list of vals) for this cursor, if any."""
+        return getattr(_buffers, 'by_cursor', {}).get(id(self.env.cr))
+
+    @contextmanager
+    def _buffered(self):
+        """Collect log rows inside the block and create them in one go at exit.
+
+        Nested blocks on the same cursor share the outermost buffer. If the
+        block raises, the buffered rows are dropped — the transaction they
+        belong to is being rolled back anyway.
+        """
+        if not hasattr(_buffers, 'by_cursor'):
+            _buffers.by_cursor = {}
+        key = id(self.env.cr)
+        if key in _buffers.by_cursor:
+            yield
+            return
+        buffer = _buffers.by_cursor[key] = []
+        try:
+            yield
+        finally:
+            del _buffers.by_cursor[key]
+        if buffer:
+            with self.env['sunlux.esl.sync.run']._phase('write'):
+                self.sudo().create(buffer)
+
+    # -------------------------------------------------------------------------
+    # Logging
+    # -------------------------------------------------------------------------
+
+    def _get_log_options(self):
+        """Verbosity, sampling and size cap from ir.config_parameter."""
+        ICP = self.env['ir.config_parameter'].sudo()
+        options = {'level': ICP.get_param('sunlux_esl.log_level', DEFAULT_LOG_LEVEL)}
+        for key, param, default in (
+            ('sample_percent', 'sunlux_esl.log_sample_percent', DEFAULT_SAMPLE_PERCENT),
+            ('max_size', 'sunlux_esl.log_max_size', DEFAULT_MAX_SIZE),
+        ):
+            try:
+                options[key] = int(ICP.get_param(param, default))
+            except (TypeError, ValueError):
+                options[key] = default
+        return options
 
     @api.model
     def log_api_call(self, operation, endpoint, request_data, response_code,
                      response_data, product_id=None, product_name=None,
-                     error_message=None, duration_ms=None):
-        """Create a log entry for an API call."""
-        if error_message:
-            status = 'error'
-        elif response_code and 200 <= response_code < 300:
-            status = 'success'
+                     error_message=None, duration_ms=None, status=None):
+        """Create a log entry for an API call.
+
+        ``status`` is derived from the response unless given explicitly
+        (e.g. ``'warning'`` for a retried attempt).
+
+        What is stored depends on the ``sunlux_esl.log_level`` parameter:
+
+        - ``errors``: only error and warning rows are written
+        - ``metadata``: every call, without request/response bodies
+        - ``sampled``: every call, bodies for a percentage of them
+        - ``full``: every call, with bodies
+
+        Error and warning rows always keep their bodies. Bodies are stored as
+        compact JSON capped at ``sunlux_esl.log_max_size`` characters. Inside
+        a ``_buffered()`` block the row is queued instead of created.
+        """
+        if not status:
+            if error_message:
+                status = 'error'
+            elif response_code and 200 <= response_code < 300:
+                status = 'success'
+            else:
+                status = 'error'
+
+        options = self._get_log_options()
+        level = options['level']
+        if level == 'errors' and status == 'success':
+            return self.browse()
+        if status != 'success' or level == 'full':
+            keep_bodies = True
+        elif level == 'sampled':
+            keep_bodies = random.random() * 100 < options['sample_percent']
         else:
-            status = 'error'
+            keep_bodies = False
+
+        item_count = len(request_data) if isinstance(request_data, list) else None
 
         # Use provided product_name, or look up from product_id,
         # or extract from request payload
@@ -76,15 +203,16 @@ class SunluxEslLog(models.Model):
                 if names:
                     product_name = ', '.join(names)
 
-        if isinstance(request_data, (dict, list)):
-            request_data = json.dumps(request_data, indent=2, default=str)
-        if isinstance(response_data, (dict, list)):
-            response_data = json.dumps(response_data, indent=2, default=str)
+        if keep_bodies:
+            request_data = _truncate(_serialize(request_data), options['max_size'])
+            response_data = _truncate(_serialize(response_data), options['max_size'])
+        else:
+            request_data = response_data = None
 
-        return self.create({
+        vals = {
             'operation': operation,
             'product_id': product_id,
-            'product_name': product_name or '',
+            'product_name': _truncate(product_name or '', PRODUCT_NAME_MAX_SIZE),
             'endpoint': endpoint,
             'request_data': request_data,
             'response_code': response_code,
@@ -92,4 +220,78 @@ class SunluxEslLog(models.Model):
             'status': status,
             'error_message': error_message,
             'duration_ms': duration_ms,
-        })
+            'item_count': item_count,
+        }
+        timer = self.env['sunlux.esl.sync.run']._get_timer()
+        if timer:
+            vals['run_id'] = timer.run_id
+        buffer = self._get_buffer()
+        if buffer is not None:
+            buffer.append(vals)
+            return self.browse()
+        return self.create(vals)
+
+    # -------------------------------------------------------------------------
+    # Retention
+    # -------------------------------------------------------------------------
+
+    @api.model
+    def _cron_vacuum_logs(self):
+        """Delete logs older than the retention period, in batches.
+
+        Each batch is rolled up into ``sunlux.esl.log.stats`` by the same
+        statement that deletes it, then committed, so an interrupted run
+        never double-counts or loses rows.
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+        try:
+            retention_days = int(ICP.get_param('sunlux_esl.log_retention_days', DEFAULT_RETENTION_DAYS))
+        except (TypeError, ValueError):
+            retention_days = DEFAULT_RETENTION_DAYS
+        if retention_days <= 0:
+            return
+        cutoff = fields.Datetime.now() - timedelta(days=retention_days)
+
+        while True:
+            self.env.cr.execute(SQL(
+                """
+                WITH deleted AS (
+                    DELETE FROM sunlux_esl_log
+                     WHERE id IN (SELECT id FROM sunlux_esl_log
+                                   WHERE create_date < %(cutoff)s
+                                   ORDER BY create_date
+                                   LIMIT %(limit)s)
+                 RETURNING create_date, operation, status, item_count, duration_ms
+                )
+                INSERT INTO sunlux_esl_log_stats
+                       (date, operation, status, call_count, error_count, item_count,
+                        duration_sum_ms, duration_max_ms,
+                        create_uid, create_date, write_uid, write_date)
+                SELECT create_date::date, operation, status,
+                       count(*),
+                       count(*) FILTER (WHERE status = 'error'),
+                       COALESCE(sum(item_count), 0),
+                       COALESCE(sum(duration_ms), 0),
+                       COALESCE(max(duration_ms), 0),
+                       %(uid)s, %(now)s, %(uid)s, %(now)s
+                  FROM deleted
+                 GROUP BY create_date::date, operation, status
+                ON CONFLICT (date, operation, status) DO UPDATE SET
+                       call_count = sunlux_esl_log_stats.call_count + EXCLUDED.call_count,
+                       error_count = sunlux_esl_log_stats.error_count + EXCLUDED.error_count,
+                       item_count = sunlux_esl_log_stats.item_count + EXCLUDED.item_count,
+                       duration_sum_ms = sunlux_esl_log_stats.duration_sum_ms + EXCLUDED.duration_sum_ms,
+                       duration_max_ms = GREATEST(sunlux_esl_log_stats.duration_max_ms,
+                                                  EXCLUDED.duration_max_ms),
+                       write_uid = EXCLUDED.write_uid,
+                       write_date = EXCLUDED.write_date
+                """,
+                cutoff=cutoff, limit=VACUUM_BATCH_SIZE,
+                uid=self.env.uid, now=fields.Datetime.now(),
+            ))
+            if not self.env.cr.rowcount:
+                break
+            self.env.cr.commit()
+        self.invalidate_model()
+        self.env['sunlux.esl.log.stats'].invalidate_model()
+        self.env['sunlux.esl.sync.run'].sudo().search([('start_date', '<', cutoff)]).unlink()
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+from odoo import fields, models, tools
+from odoo.tools import SQL
+
+from .sunlux_esl_log import OPERATION_SELECTION
+
+# period key -> (date_trunc unit, minutes per bucket)
+PERIODS = {
+    'hour': ('hour', 60),
+    'day': ('day', 1440),
+}
+
+
+class SunluxEslLogReport(models.Model):
+    """Latency percentiles and throughput per operation, per hour and per day.
+
+    Computed live from ``sunlux.esl.log``, so it only covers the retention
+    period. Percentiles cannot be re-aggregated: filter on a single period
+    and group by its own bucket (e.g. ``date:hour`` for hourly rows).
+    """
+
+    _name = 'sunlux.esl.log.report'
+    _description = 'SUNLUX ESL API Performance'
+    _auto = False
+    _order = 'date desc, operation'
+    _rec_name = 'date'
+
+    period = fields.Selection([
+        ('hour', 'Hourly'),
+        ('day', 'Daily'),
+    ], string='Period', readonly=True)
+    date = fields.Datetime(string='Period Start', readonly=True)
+    operation = fields.Selection(OPERATION_SELECTION, string='Operation', readonly=True)
+
+    call_count = fields.Integer(string='Calls', readonly=True, aggregator='sum')
+    error_count = fields.Integer(string='Errors', readonly=True, aggregator='sum')
+    item_count = fields.Integer(string='Items', readonly=True, aggregator='sum')
+    duration_avg_ms = fields.Float(string='Avg (ms)', readonly=True, aggregator='avg')
+    duration_p50_ms = fields.Float(string='p50 (ms)', readonly=True, aggregator='max')
+    duration_p95_ms = fields.Float(string='p95 (ms)', readonly=True, aggregator='max')
+    duration_p99_ms = fields.Float(string='p99 (ms)', readonly=True, aggregator='max')
+    items_per_call = fields.Float(string='Items per Call', readonly=True, aggregator='avg')
+    items_per_minute = fields.Float(
+        string='Items per Minute', readonly=True, aggregator='avg',
+        help='Items sent during the period divided by its length in minutes',
+    )
+
+    def _select_period(self, period, id_parity):
+        """Aggregate the log per ``period`` bucket and operation.
+
+        Ids are derived from the lowest log id of the bucket; ``id_parity``
+        keeps hourly and daily rows from colliding. Retried attempts
+        (``warning`` rows) are not calls of their own: the call they belong
+        to is logged once it finishes. Calls logged without a duration still
+        count, but only timed ones make the latency figures (aggregates skip
+        NULLs).
+        """
+        trunc_unit, minutes = PERIODS[period]
+        return SQL(
+            """
+            SELECT min(l.id) * 2 + %(parity)s AS id,
+                   %(period)s AS period,
+                   date_trunc(%(unit)s, l.create_date) AS date,
+                   l.operation,
+                   count(*) AS call_count,
+                   count(*) FILTER (WHERE l.status = 'error') AS error_count,
+                   COALESCE(sum(l.item_count), 0) AS item_count,
+                   avg(l.duration_ms) AS duration_avg_ms,
+                   percentile_cont(0.50) WITHIN GROUP (ORDER BY l.duration_ms) AS duration_p50_ms,
+                   percentile_cont(0.95) WITHIN GROUP (ORDER BY l.duration_ms) AS duration_p95_ms,
+                   percentile_cont(0.99) WITHIN GROUP (ORDER BY l.duration_ms) AS duration_p99_ms,
+                   COALESCE(sum(l.item_count), 0)::float / count(*) AS items_per_call,
+                   COALESCE(sum(l.item_count), 0)::float / %(minutes)s AS items_per_minute
+              FROM sunlux_esl_log l
+             WHERE l.status != 'warning'
+             GROUP BY date_trunc(%(unit)s, l.create_date), l.operation
+            """,
+            parity=id_parity, period=period, unit=trunc_unit, minutes=minutes,
+        )
+
+    def init(self):
+        tools.drop_view_if_exists(self.env.cr, self._table)
+        self.env.cr.execute(SQL(
+            "CREATE OR REPLACE VIEW %s AS (%s UNION ALL %s)",
+            SQL.identifier(self._table),
+            self._select_period('hour', 0),
+            self._select_period('day', 1),
+        ))
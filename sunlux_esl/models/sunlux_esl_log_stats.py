@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from odoo import api, fields, models
+
+from .sunlux_esl_log import OPERATION_SELECTION, STATUS_SELECTION
+
+
+class SunluxEslLogStats(models.Model):
+    """Daily rollup of API log rows removed by the retention vacuum."""
+
+    _name = 'sunlux.esl.log.stats'
+    _description = 'SUNLUX ESL API Daily Stats'
+    _order = 'date desc, operation, status'
+    _rec_name = 'date'
+
+    date = fields.Date(string='Date', required=True, index=True)
+    operation = fields.Selection(OPERATION_SELECTION, string='Operation', required=True)
+    status = fields.Selection(STATUS_SELECTION, string='Status', required=True)
+
+    call_count = fields.Integer(string='Calls', aggregator='sum')
+    error_count = fields.Integer(string='Errors', aggregator='sum')
+    item_count = fields.Integer(string='Items', aggregator='sum')
+    duration_sum_ms = fields.Integer(string='Total Duration (ms)', aggregator='sum')
+    duration_max_ms = fields.Integer(string='Max Duration (ms)', aggregator='max')
+    duration_avg_ms = fields.Float(
+        string='Avg Duration (ms)', compute='_compute_duration_avg_ms',
+    )
+
+    _date_operation_status_uniq = models.Constraint(
+        'UNIQUE(date, operation, status)',
+        'There can be only one stats row per day, operation and status.',
+    )
+
+    @api.depends('call_count', 'duration_sum_ms')
+    def _compute_duration_avg_ms(self):
+        for rec in self:
+            rec.duration_avg_ms = (
+                rec.duration_sum_ms / rec.call_count if rec.call_count else 0.0
+            )
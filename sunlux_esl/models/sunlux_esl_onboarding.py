@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+import gzip
+import io
+import itertools
+import json
+import logging
+import tempfile
+from collections import deque
+
+from odoo import _, api, fields, models
+from odoo.exceptions import UserError, ValidationError
+from odoo.tools import SQL
+from odoo.tools.safe_eval import safe_eval
+
+from .sunlux_esl_circuit import SunluxEslCircuitOpen
+
+_logger = logging.getLogger(__name__)
+
+# Products per request when replaying an export
+DEFAULT_CHUNK_SIZE = 2000
+
+# Products enabled and exported per page
+EXPORT_PAGE_SIZE = 1000
+
+
+class SunluxEslOnboarding(models.Model):
+    """Bulk onboarding of products into a SUNLUX store.
+
+    Export, run in the background like the replay, enables ESL sync on
+    every product of the domain straight in SQL — no ``write()`` hook, no
+    queue entry per product — and streams the full-sync payloads of the
+    products SUNLUX does not know yet to a gzipped JSONL file. Those
+    products are flagged with the onboarding, so saves, the scheduled sync
+    and goodsId reconciliation do not send them a second time. Replay
+    sends that file in large chunks; the offset of the last line whose
+    result was written back is committed after each chunk, so an
+    interrupted replay resumes where it stopped. Products SUNLUX does not
+    accept are handed to the sync queue.
+    """
+
+    _name = 'sunlux.esl.onboarding'
+    _description = 'SUNLUX ESL Bulk Onboarding'
+    _order = 'id desc'
+
+    name = fields.Char(
+        string='Onboarding', required=True,
+        default=lambda self: _("Onboarding %s", fields.Date.context_today(self)),
+    )
+    store_id = fields.Many2one(
+        'sunlux.esl.store', string='Store', ondelete='restrict',
+        help='Store the products are assigned to. Leave empty for the '
+             'credentials from Settings.',
+    )
+    domain = fields.Char(
+        string='Products', required=True, default="[('sale_ok', '=', True)]",
+        help='Products to enable ESL sync on',
+    )
+    chunk_size = fields.Integer(
+        string='Items per Request', required=True, default=DEFAULT_CHUNK_SIZE,
+    )
+    state = fields.Selection([
+        ('draft', 'Draft'),
+        ('exporting', 'Exporting'),
+        ('exported', 'Exported'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], string='Status', required=True, default='draft', readonly=True, copy=False)
+    attachment_id = fields.Many2one(
+        'ir.attachment', string='Export File', readonly=True, copy=False,
+    )
+    product_count = fields.Integer(string='Products Enabled', readonly=True, copy=False)
+    line_count = fields.Integer(
+        string='Products Exported', readonly=True, copy=False,
+        help='Products without a goodsId in the export file',
+    )
+    offset = fields.Integer(
+        string='Committed Offset', readonly=True, copy=False,
+        help='Lines of the export file sent and written back; a replay resumes here',
+    )
+    synced_count = fields.Integer(string='Synced', readonly=True, copy=False)
+    failed_count = fields.Integer(
+        string='Queued for Retry', readonly=True, copy=False,
+        help='Products SUNLUX did not accept; they were handed to the sync queue',
+    )
+    progress = fields.Float(string='Progress', compute='_compute_progress')
+    error_message = fields.Text(string='Last Error', readonly=True, copy=False)
+
+    @api.depends('offset', 'line_count')
+    def _compute_progress(self):
+        for job in self:
+            job.progress = job.offset * 100.0 / job.line_count if job.line_count else 0.0
+
+    @api.constrains('chunk_size')
+    def _check_chunk_size(self):
+        for job in self:
+            if job.chunk_size < 1:
+                raise ValidationError(_("Items per Request must be at least 1."))
+
+    def unlink(self):
+        attachments = self.attachment_id
+        result = super().unlink()
+        attachments.unlink()
+        return result
+
+    # -------------------------------------------------------------------------
+    # Export
+    # -------------------------------------------------------------------------
+
+    def action_export(self):
+        """Enable ESL sync on the domain and write the export file, in the
+        background."""
+        for job in self:
+            if job.state != 'draft':
+                raise UserError(_("%s was already exported.", job.name))
+        self.write({'state': 'exporting', 'error_message': False})
+        self._trigger_cron()
+        return True
+
+    def _export(self):
+        self.ensure_one()
+        product_model = self.env['product.template']
+        product_ids = product_model.search(safe_eval(self.domain), order='id').ids
+        store_id = self.store_id.id or None
+        # Spooled to disk: only the compressed file is ever held in memory
+        buffer = tempfile.TemporaryFile()
+        line_count = 0
+        name_cache = {}
+        with buffer, gzip.GzipFile(fileobj=buffer, mode='wb') as file:
+            for start in range(0, len(product_ids), EXPORT_PAGE_SIZE):
+                page_ids = product_ids[start:start + EXPORT_PAGE_SIZE]
+                # Bypasses write(): nothing is queued, the export is the sync.
+                # Products moving to another store start over, as in write().
+                self.env.cr.execute(SQL(
+                    """
+                    UPDATE product_template
+                       SET sunlux_esl_sync_enabled = TRUE,
+                           sunlux_store_id = %(store)s,
+                           sunlux_goods_id = CASE WHEN sunlux_store_id IS DISTINCT FROM %(store)s
+                                                  THEN NULL ELSE sunlux_goods_id END,
+                           sunlux_last_sync = CASE WHEN sunlux_store_id IS DISTINCT FROM %(store)s
+                                                   THEN NULL ELSE sunlux_last_sync END,
+                           sunlux_payload_hash = CASE WHEN sunlux_store_id IS DISTINCT FROM %(store)s
+                                                      THEN NULL ELSE sunlux_payload_hash END,
+                           sunlux_price_hash = CASE WHEN sunlux_store_id IS DISTINCT FROM %(store)s
+                                                    THEN NULL ELSE sunlux_price_hash END,
+                           sunlux_onboarding_id = CASE WHEN sunlux_goods_id IS NULL
+                                                         OR sunlux_store_id IS DISTINCT FROM %(store)s
+                                                       THEN %(job)s ELSE sunlux_onboarding_id END
+                     WHERE id = ANY(%(ids)s)
+                    RETURNING CASE WHEN sunlux_goods_id IS NULL THEN id END
+                    """,
+                    store=store_id, job=self.id, ids=page_ids,
+                ))
+                new_ids = sorted(row[0] for row in self.env.cr.fetchall() if row[0])
+                products = product_model.browse(new_ids)
+                products.invalidate_recordset()
+                for product, data in zip(products, products._prepare_full_sync_batch(name_cache)):
+                    file.write(json.dumps({
+                        'id': product.id,
+                        'price_hash': product._get_esl_price_hash(),
+                        'payload': data,
+                    }, separators=(',', ':'), ensure_ascii=False).encode('utf-8') + b'\n')
+                line_count += len(products)
+                product_model.browse(page_ids).invalidate_recordset()
+            file.close()
+            buffer.seek(0)
+            attachment = self.env['ir.attachment'].create({
+                'name': f'sunlux_esl_onboarding_{self.id}.jsonl.gz',
+                'raw': buffer.read(),
+                'mimetype': 'application/gzip',
+                'res_model': self._name,
+                'res_id': self.id,
+            })
+        self.write({
+            'state': 'exported',
+            'attachment_id': attachment.id,
+            'product_count': len(product_ids),
+            'line_count': line_count,
+            'offset': 0,
+        })
+        _logger.info(
+            "SUNLUX ESL: onboarding %s enabled %d product(s), exported %d",
+            self.name, len(product_ids), line_count,
+        )
+
+    # -------------------------------------------------------------------------
+    # Replay
+    # -------------------------------------------------------------------------
+
+    def action_start(self):
+        """Replay the export file in the background, from the committed offset."""
+        for job in self:
+            if job.state not in ('exported', 'failed', 'running'):
+                raise UserError(_("Export %s first.", job.name))
+        self.write({'state': 'running', 'error_message': False})
+        self._trigger_cron()
+        return True
+
+    def action_restart(self):
+        """Replay the whole export file again."""
+        self.write({'offset': 0, 'synced_count': 0, 'failed_count': 0})
+        return self.action_start()
+
+    @api.model
+    def _trigger_cron(self, at=None):
+        cron = self.env.ref('sunlux_esl.ir_cron_sunlux_esl_onboarding', raise_if_not_found=False)
+        if cron:
+            cron.sudo()._trigger(at)
+
+    @api.model
+    def _cron_run_onboarding(self):
+        """Export the requested onboardings, then replay every running one,
+        committing after each chunk.
+
+        An export is a single transaction: if it fails, nothing was enabled
+        and the job goes back to draft with the error.
+        """
+        for job in self.search([('state', '=', 'exporting')], order='id'):
+            try:
+                job._export()
+            except Exception as exc:
+                self.env.cr.rollback()
+                _logger.exception("SUNLUX ESL: export of onboarding %s failed", job.name)
+                job.write({'state': 'draft', 'error_message': str(exc)})
+            self.env.cr.commit()
+        for job in self.search([('state', '=', 'running')], order='id'):
+            try:
+                job._replay()
+            except SunluxEslCircuitOpen as exc:
+                self.env.cr.rollback()
+                _logger.info("SUNLUX ESL: circuit open, onboarding %s paused", job.name)
+                self._trigger_cron(exc.retry_at)
+                return
+            except Exception as exc:
+                self.env.cr.rollback()
+                _logger.exception("SUNLUX ESL: onboarding %s failed", job.name)
+                job.write({'state': 'failed', 'error_message': str(exc)})
+                self.env.cr.commit()
+
+    def _iter_chunks(self, pending):
+        """Yield ``(payload, product_ids, None)`` chunks of the export file
+        from the committed offset, skipping deleted products.
+
+        Lines are read lazily. For each chunk handed out, ``(lines read,
+        {product id: price fingerprint})`` is appended to ``pending``, for
+        the caller to pop once the chunk is written back.
+        """
+        product_model = self.env['product.template']
+        skipped = 0
+        with gzip.GzipFile(fileobj=io.BytesIO(self.attachment_id.raw)) as file:
+            lines = itertools.islice(file, self.offset, None)
+            while True:
+                rows = [json.loads(line) for line in itertools.islice(lines, self.chunk_size)]
+                if not rows:
+                    return
+                existing = set(product_model.browse([row['id'] for row in rows]).exists().ids)
+                line_count = skipped + len(rows)
+                rows = [row for row in rows if row['id'] in existing]
+                if not rows:
+                    # Only deleted products: counted with the next chunk
+                    skipped = line_count
+                    continue
+                skipped = 0
+                pending.append((line_count, {row['id']: row['price_hash'] for row in rows}))
+                yield [row['payload'] for row in rows], [row['id'] for row in rows], None
+
+    def _replay(self):
+        self.ensure_one()
+        if not self.attachment_id:
+            raise UserError(_("%s has no export file.", self.name))
+        product_model = self.env['product.template']
+        queue = self.env['sunlux.esl.sync.queue']
+        api_client = self.env['sunlux.esl.api']._for_store(self.store_id)
+        exported_at = self.attachment_id.create_date
+        pending = deque()
+        for (payload, ids, _names), result in api_client.iter_sync_products_full(
+                self._iter_chunks(pending)):
+            line_count, price_hashes = pending.popleft()
+            # Each chunk is its own transaction: stamp it with its own time,
+            # which is also the write_date the write-back sets
+            now = self.env.cr.now()
+            products = product_model.browse(ids)
+            # Saves since the export were not queued: send them once SUNLUX
+            # knows the product
+            edited = products.filtered(lambda p: p.write_date > exported_at)
+            failures = products._apply_esl_full_sync_result(
+                payload, result, now, price_hashes=price_hashes,
+            )
+            self._release_products(ids)
+            queue._enqueue(list(failures), 'full')
+            queue._enqueue([pid for pid in edited.ids if pid not in failures], 'light')
+            self.write({
+                'offset': self.offset + line_count,
+                'synced_count': self.synced_count + len(ids) - len(failures),
+                'failed_count': self.failed_count + len(failures),
+            })
+            self.env.cr.commit()
+        self._release_products()
+        self.write({'state': 'done', 'offset': self.line_count})
+        self.env.cr.commit()
+        _logger.info(
+            "SUNLUX ESL: onboarding %s done — %d synced, %d queued for retry",
+            self.name, self.synced_count, self.failed_count,
+        )
+
+    def _release_products(self, product_ids=None):
+        """Hand the products of this onboarding (or ``product_ids`` of them)
+        back to the per-product sync paths."""
+        self.ensure_one()
+        condition = SQL("TRUE") if product_ids is None else SQL("id = ANY(%s)", product_ids)
+        self.env.cr.execute(SQL(
+            "UPDATE product_template SET sunlux_onboarding_id = NULL"
+            " WHERE sunlux_onboarding_id = %s AND %s",
+            self.id, condition,
+        ))
+        self.env['product.template'].invalidate_model(['sunlux_onboarding_id'])
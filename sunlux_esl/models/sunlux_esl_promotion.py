@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+import logging
+from datetime import timedelta
+
+from odoo import _, api, fields, models
+from odoo.exceptions import ValidationError
+
+_logger = logging.getLogger(__name__)
+
+# Promotions starting within this many hours are pushed ahead of time
+DEFAULT_LEAD_HOURS = 48
+
+
+class SunluxEslPromotion(models.Model):
+    """Scheduled ESL price for a product between two points in time.
+
+    Promotions are pushed ahead of time by an off-peak cron, with the window
+    in ``promotionBegin`` / ``promotionEnd``: the tags switch to the
+    promotion price on their own. Outside the window a tag shows the
+    retail price, so products whose sale price is below their retail
+    price are only published once the window opens, and every product is
+    pushed again when its window ends. SUNLUX holds one window per goods,
+    so only the next promotion of a product is published at a time.
+    """
+
+    _name = 'sunlux.esl.promotion'
+    _description = 'SUNLUX ESL Scheduled Promotion'
+    _order = 'date_begin, id'
+    _rec_name = 'product_id'
+
+    product_id = fields.Many2one(
+        'product.template', string='Product', required=True, ondelete='cascade',
+        index=True, domain=[('sunlux_esl_sync_enabled', '=', True)],
+    )
+    promo_price = fields.Float(
+        string='Promotion Price', digits='Product Price', required=True,
+        help='Price shown on the ESL tag during the promotion window',
+    )
+    date_begin = fields.Datetime(string='Start', required=True)
+    date_end = fields.Datetime(string='End', required=True)
+    state = fields.Selection([
+        ('scheduled', 'Scheduled'),
+        ('published', 'Published'),
+        ('done', 'Done'),
+    ], string='Status', required=True, default='scheduled', readonly=True, copy=False,
+        help='Published: sent (or queued) to SUNLUX with its window. '
+             'Done: the window is over.')
+
+    # Backs the off-peak cron
+    _state_date_begin_idx = models.Index('(state, date_begin)')
+
+    @api.constrains('date_begin', 'date_end')
+    def _check_dates(self):
+        for promotion in self:
+            if promotion.date_end <= promotion.date_begin:
+                raise ValidationError(_("A promotion must end after it starts."))
+
+    @api.constrains('product_id', 'date_begin', 'date_end')
+    def _check_overlap(self):
+        for promotion in self:
+            overlapping = self.search_count([
+                ('id', '!=', promotion.id),
+                ('product_id', '=', promotion.product_id.id),
+                ('state', '!=', 'done'),
+                ('date_begin', '<', promotion.date_end),
+                ('date_end', '>', promotion.date_begin),
+            ], limit=1)
+            if overlapping:
+                raise ValidationError(_(
+                    "%s already has a promotion overlapping this period.",
+                    promotion.product_id.display_name,
+                ))
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        promotions = super().create(vals_list)
+        promotions._trigger_publish()
+        return promotions
+
+    def write(self, vals):
+        # A published window that changes must be pushed again
+        published = self.filtered(lambda p: p.state == 'published')
+        result = super().write(vals)
+        if published and {'promo_price', 'date_begin', 'date_end'} & set(vals):
+            self.env['sunlux.esl.sync.queue']._enqueue(published.product_id.ids, 'full')
+        if 'date_begin' in vals:
+            self._trigger_publish()
+        return result
+
+    def unlink(self):
+        # Withdraw published windows from the tags
+        products = self.filtered(lambda p: p.state == 'published').product_id
+        result = super().unlink()
+        if products:
+            self.env['sunlux.esl.sync.queue']._enqueue(products.exists().ids, 'full')
+        return result
+
+    # -------------------------------------------------------------------------
+    # Publishing
+    # -------------------------------------------------------------------------
+
+    @api.model
+    def _get_lead_time(self):
+        return timedelta(hours=self.env['sunlux.esl.api']._get_int_param(
+            'sunlux_esl.promotion_lead_hours', DEFAULT_LEAD_HOURS,
+        ))
+
+    @api.model
+    def _trigger_cron(self, at=None):
+        cron = self.env.ref('sunlux_esl.ir_cron_sunlux_esl_promotions', raise_if_not_found=False)
+        if cron:
+            cron.sudo()._trigger(at)
+
+    def _trigger_publish(self):
+        """Run the publishing cron now if a scheduled promotion of ``self``
+        is already within the lead time, rather than waiting for the
+        off-peak run."""
+        limit = fields.Datetime.now() + self._get_lead_time()
+        if any(p.state == 'scheduled' and p.date_begin <= limit for p in self):
+            self._trigger_cron()
+
+    def _is_publishable(self, now):
+        """Whether this promotion can be sent to SUNLUX now.
+
+        Before and after its window the tag shows ``retailPrice``. That is
+        only the price charged when the product has no original price above
+        its sale price; otherwise the promotion is held back until its
+        window opens.
+        """
+        self.ensure_one()
+        if self.date_begin <= now:
+            return True
+        retail_price, sale_price = self.product_id._get_esl_prices()
+        return retail_price == sale_price
+
+    # -------------------------------------------------------------------------
+    # Off-peak cron
+    # -------------------------------------------------------------------------
+
+    def _cron_publish_promotions(self):
+        """Close finished promotions and publish the upcoming ones.
+
+        The products of finished windows are queued for a full push: the
+        regular price goes back to SUNLUX and the window is cleared, as the
+        tag only falls back to ``retailPrice`` on its own. Upcoming windows
+        are marked published and their products queued, so the queue sends
+        them in batches. The cron then schedules itself for the next window
+        boundary it has to act on.
+        """
+        lead_time = self._get_lead_time()
+        now = fields.Datetime.now()
+        queue = self.env['sunlux.esl.sync.queue']
+
+        ended = self.search([('state', '!=', 'done'), ('date_end', '<=', now)])
+        if ended:
+            ended.write({'state': 'done'})
+            queue._enqueue(ended.product_id.filtered('sunlux_goods_id').ids, 'full')
+            self.env.cr.commit()
+
+        upcoming = self.search([
+            ('state', '=', 'scheduled'),
+            ('date_begin', '<=', now + lead_time),
+        ])
+        busy = set(self.search([('state', '=', 'published')]).product_id.ids)
+        to_publish = self.browse()
+        for promotion in upcoming:   # ordered by date_begin: the next one wins
+            if promotion.product_id.id not in busy:
+                busy.add(promotion.product_id.id)
+                if promotion._is_publishable(now):
+                    to_publish |= promotion
+        if to_publish:
+            to_publish.write({'state': 'published'})
+            queue._enqueue(to_publish.product_id.ids, 'full')
+            self.env.cr.commit()
+        _logger.info(
+            "SUNLUX ESL: %d promotion(s) ended, %d published", len(ended), len(to_publish),
+        )
+
+        def next_boundary(promotion):
+            if promotion.state == 'published':
+                return promotion.date_end
+            if promotion.date_begin - lead_time > now:
+                return promotion.date_begin - lead_time
+            return promotion.date_begin     # held back until its window opens
+
+        boundaries = [
+            date for date in map(next_boundary, self.search([('state', '!=', 'done')]))
+            if date > now
+        ]
+        if boundaries:
+            self._trigger_cron(min(boundaries))
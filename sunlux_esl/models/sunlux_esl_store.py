@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+from odoo import _, api, fields, models
+from odoo.addons.base.models.res_partner import _tz_get
+
+# Credential fields whose change invalidates the cached config and token
+CREDENTIAL_FIELDS = {'base_url', 'uid', 'sid', 'key'}
+
+
+class SunluxEslStore(models.Model):
+    """A SUNLUX store with its own credentials, token and sync worker.
+
+    Products assigned to a store are synced with its credentials by its own
+    queue cron, so stores are drained in parallel (one cron worker each)
+    and a slow store does not hold the others back. Products without a
+    store use the credentials from Settings and the main queue cron.
+    """
+
+    _name = 'sunlux.esl.store'
+    _description = 'SUNLUX ESL Store'
+    _order = 'name, id'
+
+    name = fields.Char(string='Store', required=True)
+    active = fields.Boolean(default=True)
+    base_url = fields.Char(
+        string='API Base URL', required=True,
+        help='SUNLUX API server URL (e.g. https://api.sunlux.com)',
+    )
+    uid = fields.Char(string='Merchant UID', required=True, groups='base.group_system')
+    sid = fields.Char(string='Platform SID', required=True, groups='base.group_system')
+    key = fields.Char(string='Secret Key', required=True, groups='base.group_system')
+    token = fields.Char(string='Cached Token', readonly=True, copy=False, groups='base.group_system')
+    token_expire = fields.Char(string='Token Expires', readonly=True, copy=False, groups='base.group_system')
+    tz = fields.Selection(
+        _tz_get, string='Timezone',
+        help="Timezone of the store's labels, in which promotion windows are "
+             "sent. Defaults to the company's.",
+    )
+
+    cron_id = fields.Many2one(
+        'ir.cron', string='Queue Worker', readonly=True, copy=False, ondelete='set null',
+    )
+    product_count = fields.Integer(string='Products', compute='_compute_product_count')
+
+    def _compute_product_count(self):
+        counts = dict(self.env['product.template']._read_group(
+            [('sunlux_store_id', 'in', self.ids)], ['sunlux_store_id'], ['__count'],
+        ))
+        for store in self:
+            store.product_count = counts.get(store, 0)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        stores = super().create(vals_list)
+        for store in stores:
+            store.cron_id = self.env['ir.cron'].sudo().create(store._prepare_cron_vals())
+        return stores
+
+    def write(self, vals):
+        result = super().write(vals)
+        if 'active' in vals:
+            self.cron_id.sudo().active = vals['active']
+        if 'name' in vals:
+            for store in self.filtered('cron_id'):
+                store.cron_id.sudo().name = store._prepare_cron_vals()['name']
+        if CREDENTIAL_FIELDS & set(vals):
+            for store in self:
+                store.sudo().write({'token': False, 'token_expire': False})
+                self.env['sunlux.esl.api']._for_store(store)._invalidate_cache()
+        return result
+
+    def unlink(self):
+        crons = self.cron_id
+        result = super().unlink()
+        crons.sudo().unlink()
+        self.env.registry.clear_cache()
+        return result
+
+    def _prepare_cron_vals(self):
+        self.ensure_one()
+        return {
+            'name': _("SUNLUX ESL: Process Sync Queue (%s)", self.name),
+            'model_id': self.env['ir.model']._get_id('sunlux.esl.sync.queue'),
+            'state': 'code',
+            'code': f'model._cron_process_queue(store_id={self.id})',
+            'interval_number': 5,
+            'interval_type': 'minutes',
+            'active': self.active,
+        }
+
+    # -------------------------------------------------------------------------
+    # UI actions
+    # -------------------------------------------------------------------------
+
+    def action_test_connection(self):
+        """Request a fresh token with this store's credentials."""
+        self.ensure_one()
+        try:
+            self.env['sunlux.esl.api']._for_store(self)._get_token(force_refresh=True)
+            params = {
+                'title': _("Connection Successful"),
+                'message': _("%s: authenticated.", self.name),
+                'type': 'success',
+                'sticky': False,
+            }
+        except Exception as exc:
+            params = {
+                'title': _("Connection Failed"),
+                'message': str(exc),
+                'type': 'danger',
+                'sticky': True,
+            }
+        return {'type': 'ir.actions.client', 'tag': 'display_notification', 'params': params}
+
+    def action_view_products(self):
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_window',
+            'name': self.name,
+            'res_model': 'product.template',
+            'view_mode': 'list,form',
+            'domain': [('sunlux_store_id', '=', self.id)],
+            'context': {'default_sunlux_store_id': self.id, 'default_sunlux_esl_sync_enabled': True},
+        }
@@ -0,0 +1,489 @@
+# -*- coding: utf-8 -*-
+import logging
+from datetime import timedelta
+
+from odoo import api, fields, models
+from odoo.tools import SQL, str2bool
+
+from .sunlux_esl_circuit import SunluxEslCircuitOpen
+
+_logger = logging.getLogger(__name__)
+
+# Defaults, overridable through ir.config_parameter
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_QUIET_PERIOD = 5            # seconds without a save before a flush
+DEFAULT_MAX_WAIT = 60               # seconds a fresh entry waits at most
+MAX_ATTEMPTS = 5
+DEFAULT_RETRY_DELAY = 60            # seconds, doubled on every attempt
+MAX_RETRY_DELAY = 6 * 3600          # seconds
+
+# Failed products are retried in batches of at most this many, so one bad
+# item does not hold up (or take down) a large batch again
+RETRY_BATCH_SIZE = 50
+
+# What a queued product needs: the price only, a light edit of its mapped
+# fields, or a full edit. Merged entries keep the strongest one.
+SYNC_MODE_SELECTION = [
+    ('price', 'Price'),
+    ('light', 'Light Edit'),
+    ('full', 'Full Edit'),
+]
+
+# PostgreSQL channel notified (on commit) when queue work is due; the
+# payload is the store id, 0 for the Settings credentials
+NOTIFY_CHANNEL = 'sunlux_esl_sync'
+
+# Entries left in 'processing' longer than this belong to a worker that
+# died mid-batch; they are handed back to the queue on the next run.
+STALE_CLAIM_MINUTES = 15
+
+
+class SunluxEslSyncQueue(models.Model):
+    """Persistent queue of products waiting to be pushed to SUNLUX.
+
+    Saves only insert a row here; the actual API calls are made by the
+    queue cron, which drains pending entries in batches. There is at most
+    one pending entry per product — repeated edits are merged into it.
+    Products SUNLUX does not accept are retried on their own, with
+    exponential backoff, then parked as failed (the dead-letter list).
+    Entries are partitioned by store: each store has its own queue cron,
+    products without a store are drained by the main one.
+    """
+
+    _name = 'sunlux.esl.sync.queue'
+    _description = 'SUNLUX ESL Sync Queue'
+    _order = 'id'
+    _rec_name = 'product_id'
+
+    product_id = fields.Many2one(
+        'product.template', string='Product', required=True,
+        ondelete='cascade', index=True,
+    )
+    store_id = fields.Many2one(
+        'sunlux.esl.store', string='Store', readonly=True, ondelete='cascade',
+        help="Product's store when it was queued; empty for the Settings credentials",
+    )
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('failed', 'Failed'),
+    ], string='Status', required=True, default='pending', index=True)
+    enqueue_count = fields.Integer(
+        string='Merged Saves', default=1,
+        help='Number of saves coalesced into this entry',
+    )
+    sync_mode = fields.Selection(
+        SYNC_MODE_SELECTION, string='Sync', required=True, default='price',
+        help='Price: only the prices changed (skipped if they match what SUNLUX has). '
+             'Light Edit: other mapped fields changed too. '
+             'Full Edit: everything is pushed again. '
+             'Products without a goodsId always take a full edit.',
+    )
+    attempt_count = fields.Integer(string='Attempts', default=0)
+    next_attempt_date = fields.Datetime(
+        string='Next Attempt', readonly=True,
+        help='Failed products are not retried before this time',
+    )
+    claim_date = fields.Datetime(string='Claimed On', readonly=True)
+    error_message = fields.Text(string='Last Error')
+
+    _product_pending_uniq = models.UniqueIndex("(product_id) WHERE state = 'pending'")
+    # Backs the per-store claim
+    _pending_store_idx = models.Index("(store_id, id) WHERE state = 'pending'")
+
+    # -------------------------------------------------------------------------
+    # Enqueue
+    # -------------------------------------------------------------------------
+
+    @api.model
+    def _enqueue(self, product_ids, sync_mode='price', edited=False):
+        """Queue products for sync, merging into existing pending entries.
+
+        ``sync_mode`` is what changed (see ``SYNC_MODE_SELECTION``); an entry
+        merging several saves keeps the strongest mode. An entry waiting for
+        a retry keeps its date, unless the products were ``edited`` (what
+        SUNLUX is sent changed) or the merged mode is stronger: the entry
+        then starts over as a fresh one, as the data that failed is gone.
+        A deferral on an open circuit breaker is always kept.
+
+        Uses a single INSERT ... ON CONFLICT so concurrent saves of the same
+        product never collide on the pending-entry unique index. Wakes up
+        the queue cron of every store concerned once its quiet period is
+        over (see ``_get_flush_date``); nothing waits in the saving request.
+        """
+        product_ids = sorted(set(product_ids))
+        if not product_ids:
+            return
+        now = fields.Datetime.now()
+        merged_mode = self._merge_sync_mode(
+            SQL.identifier('sunlux_esl_sync_queue', 'sync_mode'),
+            SQL.identifier('excluded', 'sync_mode'),
+        )
+        self.env.cr.execute(SQL(
+            """
+            INSERT INTO sunlux_esl_sync_queue
+                   (product_id, store_id, state, sync_mode, enqueue_count, attempt_count,
+                    create_uid, create_date, write_uid, write_date)
+            SELECT t.id, t.sunlux_store_id, 'pending', %(mode)s, 1, 0,
+                   %(uid)s, %(now)s, %(uid)s, %(now)s
+              FROM product_template t
+             WHERE t.id = ANY(%(ids)s)
+             ORDER BY t.id
+            ON CONFLICT (product_id) WHERE state = 'pending'
+            DO UPDATE SET enqueue_count = sunlux_esl_sync_queue.enqueue_count + 1,
+                          store_id = EXCLUDED.store_id,
+                          sync_mode = %(merged_mode)s,
+                          attempt_count = CASE WHEN %(reset)s THEN 0
+                                               ELSE sunlux_esl_sync_queue.attempt_count END,
+                          next_attempt_date = CASE WHEN %(reset)s THEN NULL
+                                                   ELSE sunlux_esl_sync_queue.next_attempt_date END,
+                          write_uid = EXCLUDED.write_uid,
+                          write_date = EXCLUDED.write_date
+            RETURNING store_id
+            """,
+            uid=self.env.uid, now=now, ids=product_ids, mode=sync_mode,
+            merged_mode=merged_mode,
+            # Only entries in backoff have been attempted
+            reset=SQL(
+                "sunlux_esl_sync_queue.attempt_count > 0 AND (%s OR %s != sunlux_esl_sync_queue.sync_mode)",
+                edited, merged_mode,
+            ),
+        ))
+        store_ids = {row[0] for row in self.env.cr.fetchall()}
+        self.invalidate_model()
+        for store_id in store_ids:
+            self._trigger_workers({store_id}, at=self._get_flush_date(store_id))
+
+    @api.model
+    def _merge_sync_mode(self, mode, other_mode):
+        """SQL expression of the strongest of two sync modes."""
+        return SQL(
+            """CASE WHEN 'full' IN (%(a)s, %(b)s) THEN 'full'
+                     WHEN 'light' IN (%(a)s, %(b)s) THEN 'light'
+                     ELSE 'price' END""",
+            a=mode, b=other_mode,
+        )
+
+    @api.model
+    def _get_flush_date(self, store_id):
+        """Return when the fresh entries of ``store_id`` should be sent, or
+        None for right away.
+
+        Saves are debounced: the queue is flushed once no product of the
+        store was queued for the quiet period, so a burst of edits goes out
+        as one batch — unless a full batch is already waiting. A steady
+        trickle of saves keeps moving that date, so the oldest entry never
+        waits longer than the max wait.
+
+        Without the dedicated worker, the date is when the queue cron is
+        triggered: it then runs on the next poll of the cron threads, which
+        is usually later.
+        """
+        api_client = self.env['sunlux.esl.api']
+        quiet = api_client._get_int_param('sunlux_esl.queue_quiet_period', DEFAULT_QUIET_PERIOD)
+        max_wait = api_client._get_int_param('sunlux_esl.queue_max_wait', DEFAULT_MAX_WAIT)
+        batch_size = api_client._get_int_param(
+            'sunlux_esl.queue_batch_size', DEFAULT_BATCH_SIZE, minimum=1,
+        )
+        if quiet <= 0:
+            return None
+        self.env.cr.execute(SQL(
+            """
+            SELECT count(*), max(write_date), min(create_date) FROM sunlux_esl_sync_queue
+             WHERE state = 'pending' AND attempt_count = 0 AND %s
+            """,
+            SQL("store_id = %s", store_id) if store_id else SQL("store_id IS NULL"),
+        ))
+        count, last_enqueue, first_enqueue = self.env.cr.fetchone()
+        if not count or count >= batch_size:
+            return None
+        flush_date = min(
+            last_enqueue + timedelta(seconds=quiet),
+            first_enqueue + timedelta(seconds=max(max_wait, quiet)),
+        )
+        return flush_date if flush_date > fields.Datetime.now() else None
+
+    @api.model
+    def _use_dedicated_worker(self):
+        """Whether the queue is drained by ``odoo-bin sunlux_esl_worker``
+        instead of the crons."""
+        ICP = self.env['ir.config_parameter'].sudo()
+        return str2bool(ICP.get_param('sunlux_esl.dedicated_worker', 'False'), default=False)
+
+    @api.model
+    def _get_next_wakeup(self, store_id):
+        """Return when queue work of ``store_id`` is next due (a debounced
+        flush or a retry), or None if nothing is waiting for a time."""
+        now = fields.Datetime.now()
+        self.env.cr.execute(SQL(
+            """
+            SELECT min(next_attempt_date) FROM sunlux_esl_sync_queue
+             WHERE state = 'pending' AND next_attempt_date > %s AND %s
+            """,
+            now, SQL("store_id = %s", store_id) if store_id else SQL("store_id IS NULL"),
+        ))
+        dates = [self.env.cr.fetchone()[0], self._get_flush_date(store_id)]
+        dates = [date for date in dates if date]
+        return min(dates) if dates else None
+
+    @api.model
+    def _trigger_workers(self, store_ids, at=None):
+        """Wake up the queue crons of ``store_ids`` (None: the main cron),
+        now or at ``at``.
+
+        New work is also announced on ``NOTIFY_CHANNEL`` (on commit) for
+        the dedicated worker (``odoo-bin sunlux_esl_worker``), which works
+        out when it is due by itself — so the worker does not notify
+        itself. When the dedicated worker is enabled, the crons are left
+        alone.
+        """
+        if not self.env.context.get('sunlux_esl_worker'):
+            for store_id in store_ids:
+                self.env.cr.execute(SQL(
+                    "SELECT pg_notify(%s, %s)", NOTIFY_CHANNEL, str(store_id or 0),
+                ))
+        if self._use_dedicated_worker():
+            return
+        crons = self.env['sunlux.esl.store'].sudo().browse(
+            [store_id for store_id in store_ids if store_id]
+        ).cron_id
+        if None in store_ids:
+            main_cron = self.env.ref('sunlux_esl.ir_cron_sunlux_esl_sync_queue', raise_if_not_found=False)
+            if main_cron:
+                crons |= main_cron.sudo()
+        for cron in crons:
+            cron._trigger(at)
+
+    # -------------------------------------------------------------------------
+    # Drain (cron)
+    # -------------------------------------------------------------------------
+
+    @api.model
+    def _cron_process_queue(self, store_id=None):
+        """Drain the pending entries of one store in batches, committing
+        after each batch.
+
+        ``store_id`` is set by the store's own cron; the main cron drains
+        products without a store. Batches are claimed with SKIP LOCKED, so
+        several workers can drain the queue side by side without picking
+        the same entries.
+        """
+        if self._use_dedicated_worker() and not self.env.context.get('sunlux_esl_worker'):
+            return
+        batch_size = self.env['sunlux.esl.api']._get_int_param(
+            'sunlux_esl.queue_batch_size', DEFAULT_BATCH_SIZE, minimum=1,
+        )
+
+        self._requeue_stale_claims()
+        self.env.cr.commit()
+
+        # Fresh entries first — unless saves are still coming in — then due
+        # retries in small batches
+        batches = [(True, min(batch_size, RETRY_BATCH_SIZE))]
+        flush_date = self._get_flush_date(store_id)
+        if flush_date:
+            self._trigger_workers({store_id or None}, at=flush_date)
+        else:
+            batches.insert(0, (False, batch_size))
+        for retry, limit in batches:
+            while True:
+                entries = self._claim_batch(limit, store_id, retry=retry)
+                if not entries:
+                    break
+                # Commit the claim so new saves of these products can queue up
+                # a fresh pending entry while this batch is in flight.
+                self.env.cr.commit()
+                if not entries._process_batch():
+                    # Endpoint is failing — leave the rest for the next run
+                    return
+                self.env.cr.commit()
+
+    def _claim_batch(self, limit, store_id=None, retry=False):
+        """Mark up to ``limit`` pending entries of ``store_id`` as processing
+        and return them.
+
+        ``retry`` selects entries that already failed (and whose backoff is
+        over) instead of fresh ones.
+        """
+        now = fields.Datetime.now()
+        self.env.cr.execute(SQL(
+            """
+            UPDATE sunlux_esl_sync_queue
+               SET state = 'processing',
+                   claim_date = %(now)s,
+                   attempt_count = attempt_count + 1
+             WHERE id IN (
+                   SELECT id FROM sunlux_esl_sync_queue
+                    WHERE state = 'pending'
+                      AND %(store)s
+                      AND %(attempts)s
+                    ORDER BY id
+                    LIMIT %(limit)s
+                      FOR UPDATE SKIP LOCKED)
+         RETURNING id
+            """,
+            now=now, limit=limit,
+            store=SQL("store_id = %s", store_id) if store_id else SQL("store_id IS NULL"),
+            attempts=SQL(
+                "attempt_count > 0 AND (next_attempt_date IS NULL OR next_attempt_date <= %s)", now,
+            ) if retry else SQL(
+                "attempt_count = 0 AND (next_attempt_date IS NULL OR next_attempt_date <= %s)", now,
+            ),
+        ))
+        ids = [row[0] for row in self.env.cr.fetchall()]
+        self.invalidate_model()
+        return self.browse(ids)
+
+    def _process_batch(self):
+        """Sync the claimed products. Returns False if the batch failed.
+
+        Products SUNLUX did not accept go back to the queue with their own
+        error; the rest of the batch is done. Entries of products a bulk
+        onboarding has taken over since they were queued are dropped: its
+        replay sends them.
+        """
+        products = self.product_id.exists().filtered(
+            lambda p: p.sunlux_esl_sync_enabled and not p.sunlux_onboarding_id
+        )
+        failures = {}
+        try:
+            if products:
+                oldest = min(self.mapped('create_date'))
+                queue_wait_ms = int((fields.Datetime.now() - oldest).total_seconds() * 1000)
+                run_model = self.env['sunlux.esl.sync.run']
+                with run_model._track(product_count=len(products), queue_wait_ms=queue_wait_ms):
+                    # Log rows of the whole run are created in one go at the end
+                    with self.env['sunlux.esl.log']._buffered():
+                        failures = products._do_esl_sync(
+                            self.env, {e.product_id.id: e.sync_mode for e in self},
+                        ) or {}
+        except SunluxEslCircuitOpen as exc:
+            # SUNLUX is down: not the products' fault, wait for the probe
+            self.env.cr.rollback()
+            _logger.info("SUNLUX ESL: circuit open, deferring %d queue entr(y/ies)", len(self))
+            self._defer(exc.retry_at)
+            self.env.cr.commit()
+            return False
+        except Exception as exc:
+            self.env.cr.rollback()
+            _logger.exception("SUNLUX ESL: queue batch of %d product(s) failed", len(self))
+            self._release(error_message=str(exc))
+            self.env.cr.commit()
+            return False
+        failed = self.filtered(lambda e: e.product_id.id in failures)
+        (self - failed).exists().unlink()
+        for error_message, entries in failed.grouped(lambda e: failures[e.product_id.id]).items():
+            entries._release(error_message=error_message)
+        return True
+
+    def _release(self, error_message=None):
+        """Hand claimed entries back to the queue (or park them as failed).
+
+        Entries whose product already has a newer pending entry are simply
+        dropped — the pending one covers them. The others are retried after
+        an exponential backoff (``retry_delay * 2 ** (attempts - 1)``).
+        """
+        if not self:
+            return
+        api_client = self.env['sunlux.esl.api']
+        max_attempts = api_client._get_int_param(
+            'sunlux_esl.queue_max_attempts', MAX_ATTEMPTS, minimum=1,
+        )
+        retry_delay = api_client._get_int_param('sunlux_esl.queue_retry_delay', DEFAULT_RETRY_DELAY)
+        self._drop_superseded()
+        self.env.cr.execute(SQL(
+            """
+            UPDATE sunlux_esl_sync_queue
+               SET state = CASE WHEN attempt_count >= %(max)s
+                                THEN 'failed' ELSE 'pending' END,
+                   claim_date = NULL,
+                   next_attempt_date = %(now)s + make_interval(
+                       secs => LEAST(%(delay)s * power(2, GREATEST(attempt_count - 1, 0)), %(cap)s)),
+                   error_message = %(error)s
+             WHERE id IN %(ids)s
+            """,
+            ids=tuple(self.ids), max=max_attempts, error=error_message,
+            now=fields.Datetime.now(), delay=retry_delay, cap=MAX_RETRY_DELAY,
+        ))
+        self.invalidate_model()
+
+    def _defer(self, until):
+        """Hand claimed entries back untouched, to be picked up at ``until``.
+
+        Used while the circuit breaker is open: the attempt is not counted
+        and the error is kept, as the products themselves did not fail.
+        """
+        if not self:
+            return
+        store_ids = set(self.mapped(lambda e: e.store_id.id or None))
+        self._drop_superseded()
+        self.env.cr.execute(SQL(
+            """
+            UPDATE sunlux_esl_sync_queue
+               SET state = 'pending',
+                   claim_date = NULL,
+                   attempt_count = GREATEST(attempt_count - 1, 0),
+                   next_attempt_date = %(until)s
+             WHERE id IN %(ids)s
+            """,
+            ids=tuple(self.ids), until=until,
+        ))
+        self.invalidate_model()
+        self._trigger_workers(store_ids, at=until)
+
+    def _drop_superseded(self):
+        """Delete entries whose product already has a newer pending entry,
+        handing their sync mode over to it."""
+        self.env.cr.execute(SQL(
+            """
+            UPDATE sunlux_esl_sync_queue p
+               SET sync_mode = %(merged_mode)s
+              FROM sunlux_esl_sync_queue q
+             WHERE q.id IN %(ids)s
+               AND p.product_id = q.product_id
+               AND p.state = 'pending'
+            """,
+            ids=tuple(self.ids),
+            merged_mode=self._merge_sync_mode(
+                SQL.identifier('p', 'sync_mode'), SQL.identifier('q', 'sync_mode'),
+            ),
+        ))
+        self.env.cr.execute(SQL(
+            """
+            DELETE FROM sunlux_esl_sync_queue q
+             WHERE q.id IN %(ids)s
+               AND EXISTS (SELECT 1 FROM sunlux_esl_sync_queue p
+                            WHERE p.product_id = q.product_id
+                              AND p.state = 'pending')
+            """,
+            ids=tuple(self.ids),
+        ))
+
+    @api.model
+    def _requeue_stale_claims(self):
+        """Release entries claimed by a worker that never finished."""
+        limit = fields.Datetime.now() - timedelta(minutes=STALE_CLAIM_MINUTES)
+        stale = self.search([
+            ('state', '=', 'processing'),
+            ('claim_date', '<', limit),
+        ])
+        if stale:
+            _logger.warning(
+                "SUNLUX ESL: re-queueing %d stale queue entr(y/ies)", len(stale),
+            )
+            stale._release(error_message='Worker stopped before finishing the batch')
+
+    # -------------------------------------------------------------------------
+    # UI actions
+    # -------------------------------------------------------------------------
+
+    def action_retry(self):
+        """Put failed entries back into the queue."""
+        failed = self.filtered(lambda e: e.state == 'failed')
+        products_by_mode = {
+            sync_mode: entries.product_id
+            for sync_mode, entries in failed.grouped('sync_mode').items()
+        }
+        failed.unlink()
+        for sync_mode, products in products_by_mode.items():
+            self._enqueue(products.ids, sync_mode)
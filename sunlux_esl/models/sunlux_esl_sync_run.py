@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+import cProfile
+import io
+import pstats
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+from odoo import fields, models
+
+# Phase key -> field storing its duration
+PHASE_FIELDS = {
+    'fetch': 'fetch_ms',
+    'build': 'build_ms',
+    'token': 'token_ms',
+    'serialize': 'serialize_ms',
+    'http': 'http_ms',
+    'match': 'match_ms',
+    'write': 'write_ms',
+}
+
+# Number of functions kept in the stored profile report
+PROFILE_REPORT_LINES = 40
+
+# Active runs of the current thread, keyed by cursor
+_active = threading.local()
+
+
+class _PhaseTimer:
+    """Accumulates wall-clock seconds per phase for one run."""
+
+    def __init__(self, run_id):
+        self.run_id = run_id
+        self.durations = defaultdict(float)
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations[name] += time.perf_counter() - start
+
+
+class SunluxEslSyncRun(models.Model):
+    """One sync run (a queue batch) with the time spent in each phase.
+
+    Phases are timed on the thread that owns the cursor. ``http`` is the time
+    spent waiting for responses, so with parallel dispatch it is wall-clock,
+    not the sum of the individual request durations.
+    """
+
+    _name = 'sunlux.esl.sync.run'
+    _description = 'SUNLUX ESL Sync Run'
+    _order = 'id desc'
+    _rec_name = 'start_date'
+
+    start_date = fields.Datetime(string='Started', required=True, index=True)
+    trigger = fields.Selection([
+        ('queue', 'Sync Queue'),
+    ], string='Trigger', required=True, default='queue')
+    state = fields.Selection([
+        ('running', 'Running'),
+        ('done', 'Done'),
+    ], string='Status', required=True, default='running')
+    product_count = fields.Integer(string='Products')
+
+    queue_wait_ms = fields.Integer(
+        string='Queue Wait (ms)', aggregator='avg',
+        help='Time the oldest product of the batch spent in the queue',
+    )
+    fetch_ms = fields.Integer(string='Record Fetch (ms)', aggregator='avg')
+    build_ms = fields.Integer(string='Payload Build (ms)', aggregator='avg')
+    token_ms = fields.Integer(string='Token (ms)', aggregator='avg')
+    serialize_ms = fields.Integer(string='Serialize (ms)', aggregator='avg')
+    http_ms = fields.Integer(string='HTTP (ms)', aggregator='avg')
+    match_ms = fields.Integer(string='Result Matching (ms)', aggregator='avg')
+    write_ms = fields.Integer(string='DB Write-back (ms)', aggregator='avg')
+    total_ms = fields.Integer(string='Total (ms)', aggregator='avg')
+
+    profile_stats = fields.Text(string='Profile', readonly=True)
+    log_ids = fields.One2many('sunlux.esl.log', 'run_id', string='API Calls')
+
+    # -------------------------------------------------------------------------
+    # Tracking
+    # -------------------------------------------------------------------------
+
+    def _get_timer(self):
+        """Return the phase timer of the run active on this cursor, if any."""
+        return getattr(_active, 'by_cursor', {}).get(id(self.env.cr))
+
+    def _phase(self, name):
+        """Context manager timing ``name`` in the active run (no-op without one)."""
+        timer = self._get_timer()
+        return timer.phase(name) if timer else nullcontext()
+
+    @contextmanager
+    def _track(self, trigger='queue', product_count=0, queue_wait_ms=None):
+        """Record a run around the block, with per-phase timings.
+
+        Profiles the block with ``_start_profiler`` when a profile was
+        requested from Settings (one run only). Nested calls on the same
+        cursor are folded into the outer run.
+        """
+        if self._get_timer():
+            yield self.browse()
+            return
+        if not hasattr(_active, 'by_cursor'):
+            _active.by_cursor = {}
+        run = self.sudo().create({
+            'start_date': fields.Datetime.now(),
+            'trigger': trigger,
+            'product_count': product_count,
+            'queue_wait_ms': queue_wait_ms,
+        })
+        timer = _active.by_cursor[id(self.env.cr)] = _PhaseTimer(run.id)
+        profiler = self._start_profiler() if self._consume_profile_request() else None
+        start = time.perf_counter()
+        try:
+            yield run
+        finally:
+            del _active.by_cursor[id(self.env.cr)]
+            profile_stats = self._stop_profiler(profiler) if profiler else False
+        vals = {
+            field_name: int(timer.durations.get(phase, 0.0) * 1000)
+            for phase, field_name in PHASE_FIELDS.items()
+        }
+        vals.update({
+            'state': 'done',
+            'total_ms': int((time.perf_counter() - start) * 1000),
+            'profile_stats': profile_stats,
+        })
+        run.write(vals)
+
+    # -------------------------------------------------------------------------
+    # Profiling hook — override _start_profiler/_stop_profiler to plug in
+    # another profiler
+    # -------------------------------------------------------------------------
+
+    def _consume_profile_request(self):
+        """True (once) if Settings asked to profile the next run."""
+        ICP = self.env['ir.config_parameter'].sudo()
+        if not ICP.get_param('sunlux_esl.profile_next_run'):
+            return False
+        ICP.set_param('sunlux_esl.profile_next_run', False)
+        return True
+
+    def _start_profiler(self):
+        """Start and return a profiler for the current run."""
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def _stop_profiler(self, profiler):
+        """Stop ``profiler`` and return its report as text."""
+        profiler.disable()
+        out = io.StringIO()
+        stats = pstats.Stats(profiler, stream=out)
+        stats.sort_stats('cumulative').print_stats(PROFILE_REPORT_LINES)
+        return out.getvalue()